@@ -1,13 +1,22 @@
 import argparse
+import json
+import os
 import random
 from collections import Counter
+from multiprocessing import Pool
 from pathlib import Path
 from pprint import pprint
-from typing import Dict, List
+from typing import Collection, Dict, List, Optional
 
 import ndjson
 
-from hihobot.vectorizer import Vectorizer
+from hihobot.utility import bounded_imap
+from hihobot.vectorizer import BaseTokenizer, create_tokenizer, load_doc2vec_model
+
+_worker_tokenizer: Optional[BaseTokenizer] = None
+_worker_vocabulary: Optional[Collection[str]] = None
+_worker_chars: Optional[Collection[str]] = None
+_worker_num_bin: Optional[int] = None
 
 
 def _load_text(p: Path):
@@ -15,29 +24,134 @@ def _load_text(p: Path):
     return [d['str'] for d in ds]
 
 
+def _get_vocabulary(doc2vec_model) -> Collection[str]:
+    """
+    the word to index dict of the model, gensim 4 has `key_to_index` and gensim 3 has `vocab`
+    """
+    wv = doc2vec_model.wv
+    if hasattr(wv, 'key_to_index'):
+        return wv.key_to_index
+    return wv.vocab
+
+
+def _init_worker(tokenizer: str, vocabulary: Collection[str], chars: Collection[str], num_bin: int):
+    global _worker_tokenizer, _worker_vocabulary, _worker_chars, _worker_num_bin
+    _worker_tokenizer = create_tokenizer(tokenizer)
+    _worker_vocabulary = vocabulary
+    _worker_chars = chars
+    _worker_num_bin = num_bin
+
+
+def _analyze_chunk(texts: List[str]):
+    unknown_words = Counter()
+    unknown_chars = Counter()
+    histogram = [0] * _worker_num_bin
+    num_word = 0
+    num_char = 0
+    num_empty = 0
+    num_covered_text = 0
+
+    for text, words in zip(texts, _worker_tokenizer.to_words_many(texts)):
+        unknowns = [w for w in words if w not in _worker_vocabulary]
+        unknown_words.update(unknowns)
+        num_word += len(words)
+        if len(words) == 0:
+            num_empty += 1
+        else:
+            histogram[min(int(len(unknowns) / len(words) * _worker_num_bin), _worker_num_bin - 1)] += 1
+
+        text_unknown_chars = [c for c in text if c not in _worker_chars]
+        unknown_chars.update(text_unknown_chars)
+        num_char += len(text)
+        if len(text_unknown_chars) == 0:
+            num_covered_text += 1
+
+    return dict(
+        unknown_words=unknown_words,
+        unknown_chars=unknown_chars,
+        histogram=histogram,
+        num_word=num_word,
+        num_char=num_char,
+        num_empty=num_empty,
+        num_covered_text=num_covered_text,
+    )
+
+
 def analyze_dataset(
         dataset_text_path: Path,
         dataset_char_path: Path,
         doc2vec_model_path: Path,
-        num_sample: int,
+        tokenizer: str,
+        num_sample: Optional[int],
         show_num: int,
+        num_bin: int,
+        chunk_size: int,
+        num_process: int,
+        output_path: Optional[Path],
 ):
-    vectorizer = Vectorizer(path_doc2vec_model=doc2vec_model_path)
-
-    vocabulary = list(vectorizer._doc2vec_model.wv.vocab.keys())
+    """
+    word coverage of the doc2vec vocabulary and char coverage of `dataset_char.json`, over all the texts.
+    the texts are tokenized in chunks on a process pool and the counts of the chunks are summed.
+    :param num_sample: number of texts sampled at random, None means all
+    :param num_bin: number of bins of the histogram of the unknown word ratio per text, over [0, 1]
+    """
+    vocabulary = _get_vocabulary(load_doc2vec_model(doc2vec_model_path))
+    chars = frozenset(json.load(dataset_char_path.open(encoding='UTF8')))
 
     texts = _load_text(dataset_text_path)
-    texts = random.sample(texts, num_sample)
+    if num_sample is not None and num_sample < len(texts):
+        texts = random.sample(texts, num_sample)
 
-    unknown_words = [
-        word
-        for text in texts
-        for word in vectorizer.to_words(text)
-        if word not in vocabulary
-    ]
+    unknown_words = Counter()
+    unknown_chars = Counter()
+    histogram = [0] * num_bin
+    num_word = 0
+    num_char = 0
+    num_empty = 0
+    num_covered_text = 0
+
+    chunks = (texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size))
+    initargs = (tokenizer, vocabulary, chars, num_bin)
+    with Pool(num_process, initializer=_init_worker, initargs=initargs) as pool:
+        for result in bounded_imap(pool, _analyze_chunk, chunks):
+            unknown_words.update(result['unknown_words'])
+            unknown_chars.update(result['unknown_chars'])
+            histogram = [a + b for a, b in zip(histogram, result['histogram'])]
+            num_word += result['num_word']
+            num_char += result['num_char']
+            num_empty += result['num_empty']
+            num_covered_text += result['num_covered_text']
+
+    num_unknown_word = sum(unknown_words.values())
+    num_unknown_char = sum(unknown_chars.values())
+    report = dict(
+        num_text=len(texts),
+        word=dict(
+            vocabulary_size=len(vocabulary),
+            num_word=num_word,
+            num_unknown_word=num_unknown_word,
+            unknown_ratio=num_unknown_word / num_word if num_word > 0 else 0.0,
+            num_distinct_unknown_word=len(unknown_words),
+            num_empty_text=num_empty,
+            unknown_ratio_histogram=[
+                dict(min=i / num_bin, max=(i + 1) / num_bin, num_text=n)
+                for i, n in enumerate(histogram)
+            ],
+            most_common_unknown_words=unknown_words.most_common(show_num),
+        ),
+        char=dict(
+            num_known_char=len(chars),
+            num_char=num_char,
+            num_unknown_char=num_unknown_char,
+            unknown_ratio=num_unknown_char / num_char if num_char > 0 else 0.0,
+            num_covered_text=num_covered_text,
+            most_common_unknown_chars=unknown_chars.most_common(show_num),
+        ),
+    )
 
-    counter = Counter(unknown_words)
-    pprint(counter.most_common(show_num))
+    pprint(report)
+    if output_path is not None:
+        json.dump(report, output_path.open('w', encoding='UTF8'), ensure_ascii=False, indent=2)
 
 
 if __name__ == '__main__':
@@ -45,14 +159,24 @@ if __name__ == '__main__':
     parser.add_argument('--dataset_text_path', type=Path)
     parser.add_argument('--dataset_char_path', type=Path)
     parser.add_argument('--doc2vec_model_path', type=Path)
-    parser.add_argument('--num_sample', type=int, default=3000)
+    parser.add_argument('--tokenizer', default='janome_wakati')
+    parser.add_argument('--num_sample', type=int, help='analyze all the texts if not given')
     parser.add_argument('--show_num', type=int, default=100)
+    parser.add_argument('--num_bin', type=int, default=10)
+    parser.add_argument('--chunk_size', type=int, default=1000, help='number of texts per task')
+    parser.add_argument('--num_process', type=int, default=os.cpu_count())
+    parser.add_argument('--output_path', type=Path, help='write the report as json')
     args = parser.parse_args()
 
     analyze_dataset(
         dataset_text_path=args.dataset_text_path,
         dataset_char_path=args.dataset_char_path,
         doc2vec_model_path=args.doc2vec_model_path,
+        tokenizer=args.tokenizer,
         num_sample=args.num_sample,
         show_num=args.show_num,
+        num_bin=args.num_bin,
+        chunk_size=args.chunk_size,
+        num_process=args.num_process,
+        output_path=args.output_path,
     )
@@ -0,0 +1,111 @@
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from extract_text_from_mastodon import (
+    clean_up_text,
+    eliminate_hash_tag,
+    eliminate_nico_id,
+    eliminate_tag,
+    eliminate_username,
+    has_enquete,
+    has_uri,
+    is_only_arrow,
+    is_only_dot,
+    is_only_number,
+    replace_new_line,
+    strip_p_tag,
+    unescape_html,
+)
+
+_fragments = [
+    '今日はいい天気', 'おはよう', 'ねむい', 'ご飯たべた', 'test', ' ', '\n', '<p>', '</p>', '<br>', '<br />',
+    '<a href="https://example.com/">', '</a>', '<span class="h-card">', '</span>', '&lt;', '&gt;', '&amp;', '&#58;//',
+    '@hihobot', ':@user:', '#タグ', '#tag', 'sm12345', 'lv678', 'lv', 'sm', 'https://example.com/?a=b', '://',
+    'friends.nico アンケート', '123', '...', '→', '<', '>', ':', '#', '@', '&',
+]
+
+
+def clean_up_text_sequential(obj: Dict[str, Any]):
+    """
+    the cleaner before the stages were fused, for the reference
+    """
+    if "content" not in obj:
+        return None
+
+    if obj["summary"] is not None:
+        return None
+
+    s: str = obj["content"]
+    s = strip_p_tag(s)
+    s = replace_new_line(s)
+    s = eliminate_tag(s)
+    s = unescape_html(s)
+    s = eliminate_username(s)
+    s = eliminate_hash_tag(s)
+    s = eliminate_nico_id(s)
+    s = s.strip()
+
+    if has_uri(s):
+        return None
+
+    if has_enquete(s):
+        return None
+
+    if is_only_number(s):
+        return None
+
+    if is_only_dot(s):
+        return None
+
+    if is_only_arrow(s):
+        return None
+
+    return s
+
+
+def _create_posts(num_post: int, plain_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    """
+    :param plain_ratio: ratio of posts with no markup, like most of the real ones after the <p> tag
+    """
+    generator = random.Random(seed)
+    posts = []
+    for _ in range(num_post):
+        if generator.random() < plain_ratio:
+            words = [generator.choice(_fragments[:5]) for _ in range(generator.randint(1, 8))]
+            content = '<p>' + ''.join(words) + '</p>'
+        else:
+            content = ''.join(generator.choice(_fragments) for _ in range(generator.randint(1, 12)))
+        posts.append(dict(content=content, summary=None))
+    return posts
+
+
+def benchmark_clean_up_text(num_post: int, plain_ratio: float, seed: int):
+    posts = _create_posts(num_post, plain_ratio, seed)
+
+    expected = [clean_up_text_sequential(post) for post in posts]
+    actual = [clean_up_text(post) for post in posts]
+    num_mismatch = sum(e != a for e, a in zip(expected, actual))
+    print(f'mismatches: {num_mismatch} / {num_post}')
+
+    for name, function in (('sequential', clean_up_text_sequential), ('fused', clean_up_text)):
+        start = time.time()
+        for post in posts:
+            function(post)
+        elapsed = time.time() - start
+        print(f'{name}: {num_post / elapsed:.0f} posts/sec')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_post', type=int, default=200000)
+    parser.add_argument('--plain_ratio', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    benchmark_clean_up_text(
+        num_post=args.num_post,
+        plain_ratio=args.plain_ratio,
+        seed=args.seed,
+    )
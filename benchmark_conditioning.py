@@ -0,0 +1,90 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from hihobot.config import LossConfig, NetworkConfig
+from hihobot.model import Model, create_predictor
+
+
+def _create_batch(batchsize: int, length: int, num_char: int, num_vec: int, char_id_input: bool):
+    random = np.random.RandomState(0)
+    char_ids = [random.randint(num_char, size=length) for _ in range(batchsize)]
+
+    if char_id_input:
+        input_array = [ids.astype(np.int32) for ids in char_ids]
+    else:
+        input_array = [np.eye(num_char, dtype=np.float32)[ids] for ids in char_ids]
+
+    return dict(
+        input_array=input_array,
+        target_ids=[ids.astype(np.int32) for ids in char_ids],
+        vec=[random.randn(num_vec).astype(np.float32) for _ in range(batchsize)],
+    )
+
+
+def benchmark_conditioning(
+        batchsize: int,
+        length: int,
+        num_char: int,
+        num_vec: int,
+        hidden_size: int,
+        char_embed_size: int,
+        num_iteration: int,
+):
+    char_width = char_embed_size if char_embed_size is not None else num_char
+    batch = _create_batch(batchsize, length, num_char, num_vec, char_id_input=char_embed_size is not None)
+
+    for conditioning in ['concat', 'add', 'state']:
+        config = NetworkConfig(
+            n_layers=2,
+            in_size=char_width + num_vec if conditioning == 'concat' else char_width,
+            hidden_size=hidden_size,
+            out_size=num_char + 1,
+            dropout=0.0,
+            char_embed_size=char_embed_size,
+            conditioning=conditioning,
+            vec_size=num_vec,
+        )
+        model = Model(loss_config=LossConfig(), predictor=create_predictor(config))
+
+        def step():
+            model.cleargrads()
+            model(**batch).backward()
+
+        step()  # warm up
+
+        tracemalloc.start()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.time()
+        for _ in range(num_iteration):
+            step()
+        elapsed = (time.time() - start) / num_iteration
+
+        print(f'{conditioning}: {elapsed * 1000:.1f} ms/step, peak {peak / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batchsize', type=int, default=50)
+    parser.add_argument('--length', type=int, default=40)
+    parser.add_argument('--num_char', type=int, default=2048)
+    parser.add_argument('--num_vec', type=int, default=100)
+    parser.add_argument('--hidden_size', type=int, default=128)
+    parser.add_argument('--char_embed_size', type=int)
+    parser.add_argument('--num_iteration', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark_conditioning(
+        batchsize=args.batchsize,
+        length=args.length,
+        num_char=args.num_char,
+        num_vec=args.num_vec,
+        hidden_size=args.hidden_size,
+        char_embed_size=args.char_embed_size,
+        num_iteration=args.num_iteration,
+    )
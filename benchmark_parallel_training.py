@@ -0,0 +1,108 @@
+import argparse
+import os
+import time
+
+import chainer
+import numpy as np
+from chainer.iterators import SerialIterator
+
+from hihobot.config import LossConfig, NetworkConfig
+from hihobot.dataset import Data
+from hihobot.model import Model, create_predictor
+from utility.data_convert_utility import PackedConverter
+from utility.updater_utility import CpuParallelUpdater
+
+
+def _create_dataset(num_data: int, max_length: int, num_char: int, num_vec: int):
+    random = np.random.RandomState(0)
+    dataset = []
+    for _ in range(num_data):
+        char_ids = random.randint(num_char, size=random.randint(max_length // 2, max_length + 1)).astype(np.int32)
+        dataset.append(Data(
+            input_array=np.concatenate([[-1], char_ids[:-1]]).astype(np.int32),
+            target_ids=char_ids,
+            vec=random.randn(num_vec).astype(np.float32),
+        ))
+    return dataset
+
+
+def benchmark_parallel_training(
+        max_processes: int,
+        batchsize: int,
+        max_length: int,
+        num_char: int,
+        num_vec: int,
+        hidden_size: int,
+        char_embed_size: int,
+        num_iteration: int,
+):
+    """
+    run with OMP_NUM_THREADS=1, or every process uses all the cores for its own matrix products.
+    """
+    dataset = _create_dataset(batchsize * 4, max_length, num_char, num_vec)
+    config = NetworkConfig(
+        n_layers=2,
+        in_size=char_embed_size + num_vec,
+        hidden_size=hidden_size,
+        out_size=num_char + 1,
+        dropout=0.0,
+        char_embed_size=char_embed_size,
+        conditioning='concat',
+        vec_size=num_vec,
+    )
+
+    base_time = None
+    for n_processes in range(1, max_processes + 1):
+        model = Model(loss_config=LossConfig(), predictor=create_predictor(config))
+        optimizer = chainer.optimizers.Adam()
+        optimizer.setup(model)
+
+        updater = CpuParallelUpdater(
+            iterator=SerialIterator(dataset, batchsize),
+            optimizer=optimizer,
+            converter=PackedConverter(),
+            n_processes=n_processes,
+        )
+        reporter = chainer.Reporter()
+        reporter.add_observer('main', model)
+
+        with reporter.scope({}):
+            updater.update()  # warm up
+
+            start = time.time()
+            for _ in range(num_iteration):
+                updater.update()
+            elapsed = (time.time() - start) / num_iteration
+        updater.finalize()
+
+        if base_time is None:
+            base_time = elapsed
+        speedup = base_time / elapsed
+        print(
+            f'{n_processes} processes: {elapsed * 1000:.1f} ms/iteration, {batchsize / elapsed:.1f} examples/sec, '
+            f'speedup {speedup:.2f}, efficiency {speedup / n_processes:.2f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max_processes', type=int, default=os.cpu_count())
+    parser.add_argument('--batchsize', type=int, default=64)
+    parser.add_argument('--max_length', type=int, default=40)
+    parser.add_argument('--num_char', type=int, default=2048)
+    parser.add_argument('--num_vec', type=int, default=100)
+    parser.add_argument('--hidden_size', type=int, default=128)
+    parser.add_argument('--char_embed_size', type=int, default=64)
+    parser.add_argument('--num_iteration', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark_parallel_training(
+        max_processes=args.max_processes,
+        batchsize=args.batchsize,
+        max_length=args.max_length,
+        num_char=args.num_char,
+        num_vec=args.num_vec,
+        hidden_size=args.hidden_size,
+        char_embed_size=args.char_embed_size,
+        num_iteration=args.num_iteration,
+    )
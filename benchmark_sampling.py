@@ -0,0 +1,69 @@
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from hihobot.generator import Generator
+
+
+class _Predictor(object):
+    xp = np
+
+
+def _sampling_per_row(logits: np.ndarray):
+    """
+    the former sampler, which draws every row with np.random.choice
+    """
+    prob_list = np.exp(logits - logits.max(axis=1, keepdims=True))
+    prob_list /= prob_list.sum(axis=1, keepdims=True)
+    return np.array([
+        np.random.choice(np.arange(logits.shape[1]), p=prob)
+        for prob in prob_list
+    ])
+
+
+def benchmark_sampling(
+        batch_sizes: List[int],
+        num_id: int,
+        num_iteration: int,
+        top_k: int,
+        top_p: float,
+):
+    generator = Generator.__new__(Generator)  # only `sampling` is used
+    generator.predictor = _Predictor()
+    random_state = np.random.RandomState(0)
+
+    for batch_size in batch_sizes:
+        logits = random_state.randn(batch_size, num_id).astype(np.float32)
+
+        start = time.time()
+        for _ in range(num_iteration):
+            _sampling_per_row(logits)
+        elapsed_per_row = (time.time() - start) / num_iteration
+
+        start = time.time()
+        for _ in range(num_iteration):
+            generator.sampling(logits, maximum=False, top_k=top_k, top_p=top_p, random_state=random_state)
+        elapsed = (time.time() - start) / num_iteration
+
+        print(f'batch {batch_size}: per row {elapsed_per_row * 1000:.2f} ms, vectorized {elapsed * 1000:.2f} ms, '
+              f'x{elapsed_per_row / elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4, 16, 64, 256])
+    parser.add_argument('--num_id', type=int, default=2049)
+    parser.add_argument('--num_iteration', type=int, default=20)
+    parser.add_argument('--top_k', type=int)
+    parser.add_argument('--top_p', type=float)
+    args = parser.parse_args()
+
+    benchmark_sampling(
+        batch_sizes=args.batch_sizes,
+        num_id=args.num_id,
+        num_iteration=args.num_iteration,
+        top_k=args.top_k,
+        top_p=args.top_p,
+    )
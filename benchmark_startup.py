@@ -0,0 +1,113 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+
+def _read_memory():
+    """
+    :return: RSS and PSS in MiB, PSS counts a page shared by n processes as 1/n
+    """
+    memory = {}
+    for line in Path('/proc/self/smaps_rollup').read_text().splitlines():
+        key, value = line.split(':', 1)
+        if key in ('Rss', 'Pss'):
+            memory[key.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def _worker(arguments):
+    start = time.time()
+    from hihobot.hihobot import Hihobot
+    import_time = time.time() - start
+
+    start = time.time()
+    if arguments.mode == 'bundle':
+        hihobot = Hihobot.from_bundle(arguments.bundle_path, max_length=arguments.max_length, sampling_maximum=True)
+    else:
+        hihobot = Hihobot(
+            model_path=arguments.model_path,
+            model_config=arguments.model_config,
+            char_path=arguments.char_path,
+            doc2vec_model_path=arguments.doc2vec_model_path,
+            max_length=arguments.max_length,
+            sampling_maximum=True,
+            gpu=None,
+            engine='numpy',
+        )
+    hihobot.generate(hihobot.text_to_vec(arguments.text))
+    first_reply_time = time.time() - start
+
+    print(json.dumps(dict(import_time=import_time, first_reply_time=first_reply_time)), flush=True)
+
+    # measure after every worker is loaded, so the shared pages are counted by all of them
+    sys.stdin.readline()
+    print(json.dumps(_read_memory()), flush=True)
+
+
+def _run_workers(arguments, mode: str) -> List[Dict[str, float]]:
+    command = [sys.executable, __file__, '--worker', '--mode', mode]
+    for key in ('model_path', 'model_config', 'char_path', 'doc2vec_model_path', 'bundle_path', 'max_length', 'text'):
+        value = getattr(arguments, key)
+        if value is not None:
+            command += [f'--{key}', str(value)]
+
+    processes = [
+        subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        for _ in range(arguments.num_worker)
+    ]
+
+    results = [json.loads(_read_json_line(process)) for process in processes]
+    for process, result in zip(processes, results):
+        process.stdin.write('\n')
+        process.stdin.flush()
+        result.update(json.loads(_read_json_line(process)))
+        process.wait()
+    return results
+
+
+def _read_json_line(process: subprocess.Popen):
+    while True:
+        line = process.stdout.readline()
+        if line.startswith('{'):
+            return line
+        if len(line) == 0:
+            raise RuntimeError('worker exited')
+
+
+def benchmark_startup(arguments):
+    modes = []
+    if arguments.model_path is not None:
+        modes.append('files')
+    if arguments.bundle_path is not None:
+        modes.append('bundle')
+
+    for mode in modes:
+        results = _run_workers(arguments, mode)
+        print(f'{mode} ({arguments.num_worker} workers)')
+        for key, unit in (('import_time', 's'), ('first_reply_time', 's'), ('rss', 'MiB'), ('pss', 'MiB')):
+            values = [result[key] for result in results]
+            print(f'  {key}: mean {sum(values) / len(values):.2f}{unit}, max {max(values):.2f}{unit}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', '-mp', type=Path)
+    parser.add_argument('--model_config', '-mc', type=Path)
+    parser.add_argument('--char_path', '-cp', type=Path)
+    parser.add_argument('--doc2vec_model_path', '-dmp', type=Path)
+    parser.add_argument('--bundle_path', '-bp', type=Path)
+    parser.add_argument('--num_worker', type=int, default=4)
+    parser.add_argument('--max_length', type=int, default=32)
+    parser.add_argument('--text', default='おはようございます')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        _worker(arguments)
+    else:
+        benchmark_startup(arguments)
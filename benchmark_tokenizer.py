@@ -0,0 +1,49 @@
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+from hihobot.dataset import _load_text
+from hihobot.vectorizer import create_tokenizer
+
+
+def benchmark_tokenizer(
+        dataset_text_path: Path,
+        tokenizers: List[str],
+        reference_tokenizer: str,
+        num_sample: int,
+):
+    texts = _load_text(dataset_text_path)
+    if num_sample is not None:
+        texts = texts[:num_sample]
+
+    reference = list(create_tokenizer(reference_tokenizer).to_words_many(texts))
+
+    for name in tokenizers:
+        tokenizer = create_tokenizer(name)
+        list(tokenizer.to_words_many(texts[:100]))  # warm up the dictionary
+
+        start = time.time()
+        words_list = list(tokenizer.to_words_many(texts))
+        elapsed = time.time() - start
+
+        num_token = sum(len(words) for words in words_list)
+        num_mismatch = sum(words != ref for words, ref in zip(words_list, reference))
+        print(f'{name}: {num_token / elapsed:.0f} tokens/sec, {len(texts) / elapsed:.0f} texts/sec, '
+              f'{num_mismatch}/{len(texts)} texts differ from {reference_tokenizer}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_text_path', type=Path)
+    parser.add_argument('--tokenizers', nargs='+', default=['janome', 'janome_wakati'])
+    parser.add_argument('--reference_tokenizer', default='janome')
+    parser.add_argument('--num_sample', type=int)
+    args = parser.parse_args()
+
+    benchmark_tokenizer(
+        dataset_text_path=args.dataset_text_path,
+        tokenizers=args.tokenizers,
+        reference_tokenizer=args.reference_tokenizer,
+        num_sample=args.num_sample,
+    )
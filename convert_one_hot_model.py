@@ -0,0 +1,36 @@
+import argparse
+from pathlib import Path
+
+import chainer
+
+from hihobot.config import create_from_json as create_config
+from hihobot.model import convert_one_hot_predictor
+
+
+def convert_one_hot_model(
+        model_path: Path,
+        model_config: Path,
+        output_model_path: Path,
+        output_config_path: Path,
+):
+    config = create_config(model_config)
+    predictor, network_config = convert_one_hot_predictor(config.network, model_path)
+
+    chainer.serializers.save_npz(str(output_model_path), predictor)
+    config._replace(network=network_config).save_as_json(output_config_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', '-mp', type=Path)
+    parser.add_argument('--model_config', '-mc', type=Path)
+    parser.add_argument('--output_model_path', '-omp', type=Path)
+    parser.add_argument('--output_config_path', '-ocp', type=Path)
+    args = parser.parse_args()
+
+    convert_one_hot_model(
+        model_path=args.model_path,
+        model_config=args.model_config,
+        output_model_path=args.output_model_path,
+        output_config_path=args.output_config_path,
+    )
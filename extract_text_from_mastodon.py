@@ -4,7 +4,10 @@ import json
 import re
 from multiprocessing import Pool
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Iterator, TextIO
+
+from hihobot.text_filter import contain_unknown_chars  # noqa: F401  re-exported, it was defined here
+from hihobot.utility import bounded_imap
 
 
 def strip_p_tag(s: str, _re=re.compile(r"<p>(.*)</p>")):
@@ -95,17 +98,29 @@ def is_only_arrow(s: str, _re=re.compile(r"^[←↓↑→]$")):
     return _re.match(s) is not None
 
 
-def contain_unknown_chars(s: str, chars: str):
+def is_only_symbol(s: str, _re=re.compile(r"^(?:\d+|\.+|[←↓↑→])$")):
     """
-    >>> contain_unknown_chars("hogehoge", chars="hoge")
-    False
-    >>> contain_unknown_chars("hogehoge", chars="hog")
-    True
+    is_only_number, is_only_dot or is_only_arrow in one match
+    >>> [is_only_symbol(s) for s in ["123", "...", "→", "1.", "→→"]]
+    [True, True, True, False, False]
     """
-    return len(set(s) - set(chars)) > 0
+    return _re.match(s) is not None
+
+
+def eliminate_hash_tag_and_nico_id(s: str, _re=re.compile(r"#[^\s]+|lv\d+|sm\d+")):
+    """
+    eliminate_hash_tag and then eliminate_nico_id in one pass.
+    a hash tag runs until a whitespace, so removing it never joins a nico id.
+    >>> eliminate_hash_tag_and_nico_id("test1 #test2 sm12345 lv45678#test3")
+    'test1   '
+    """
+    return _re.sub("", s)
 
 
 def clean_up_text(obj: Dict[str, Any]):
+    """
+    the stages run in the order of the functions above, each one skipped when the chars it needs are absent.
+    """
     if "content" not in obj:  # ?
         return None
 
@@ -113,50 +128,145 @@ def clean_up_text(obj: Dict[str, Any]):
         return None
 
     s: str = obj["content"]
-    s = strip_p_tag(s)
-    s = replace_new_line(s)
-    s = eliminate_tag(s)
-    s = unescape_html(s)
-    s = eliminate_username(s)
-    s = eliminate_hash_tag(s)
-    s = eliminate_nico_id(s)
+    if "<" in s:
+        if "<p>" in s:
+            s = strip_p_tag(s)
+        if "<br" in s:
+            s = replace_new_line(s)
+        if "<" in s:
+            s = eliminate_tag(s)
+    if "&" in s:
+        s = unescape_html(s)
+    if "@" in s:
+        s = eliminate_username(s)
+    if "#" in s or "lv" in s or "sm" in s:
+        s = eliminate_hash_tag_and_nico_id(s)
     s = s.strip()
 
-    if has_uri(s):
-        return None
-
     if has_enquete(s):
         return None
 
-    if is_only_number(s):
+    if "://" in s and has_uri(s):
         return None
 
-    if is_only_dot(s):
-        return None
-
-    if is_only_arrow(s):
+    if is_only_symbol(s):
         return None
 
     return s
 
 
+class _StreamDecoder(object):
+    """
+    decodes json values one by one from a file, keeping only the undecoded part in memory
+    """
+
+    def __init__(self, f: TextIO, read_size: int) -> None:
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _read(self):
+        data = self.f.read(self.read_size)
+        if len(data) == 0:
+            self.eof = True
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+
+    def peek(self):
+        """
+        :return: the next non whitespace char, without consuming it
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position:self.position + 1]
+            self._read()
+
+    def expect(self, c: str):
+        if self.peek() != c:
+            raise ValueError(f'expected {c!r} at {self.buffer[self.position:self.position + 20]!r}')
+        self.position += 1
+
+    def decode(self, _decoder=json.JSONDecoder()):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer can continue in the next read
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+
+def iterate_ordered_items(f: TextIO, read_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    the items of "orderedItems" in an outbox, parsed one by one
+    >>> import io
+    >>> f = io.StringIO('{"totalItems": 2, "orderedItems": [{"a": 1}, {"b": [2]}]}')
+    >>> list(iterate_ordered_items(f, read_size=4))
+    [{'a': 1}, {'b': [2]}]
+    """
+    decoder = _StreamDecoder(f, read_size=read_size)
+    decoder.expect('{')
+    while decoder.peek() != '}':
+        key = decoder.decode()
+        decoder.expect(':')
+
+        if key != 'orderedItems':
+            decoder.decode()
+        else:
+            decoder.expect('[')
+            while decoder.peek() != ']':
+                yield decoder.decode()
+                if decoder.peek() == ',':
+                    decoder.expect(',')
+            decoder.expect(']')
+
+        if decoder.peek() == ',':
+            decoder.expect(',')
+
+
 def extract_text_from_mastodon(
         mastodon_outbox: Path,
         output_texts: Path,
+        streaming: bool,
+        chunksize: int,
 ):
-    outbox = json.load(mastodon_outbox.open(encoding='UTF8'))
-    objs = [item["object"] for item in outbox["orderedItems"]]
-    texts = filter(None, Pool().map(clean_up_text, objs))
-    output_texts.open('w', encoding='UTF8').writelines([text + "\n" for text in texts])
+    """
+    :param streaming: parse and clean the items one by one with a flat memory usage
+    """
+    if not streaming:
+        outbox = json.load(mastodon_outbox.open(encoding='UTF8'))
+        objs = [item["object"] for item in outbox["orderedItems"]]
+        texts = filter(None, Pool().map(clean_up_text, objs))
+        output_texts.open('w', encoding='UTF8').writelines([text + "\n" for text in texts])
+        return
+
+    with mastodon_outbox.open(encoding='UTF8') as f, output_texts.open('w', encoding='UTF8') as f_out, Pool() as pool:
+        objs = (item["object"] for item in iterate_ordered_items(f))
+        for text in bounded_imap(pool, clean_up_text, objs, chunksize=chunksize):
+            if text:
+                f_out.write(text + "\n")
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--mastodon_outbox', type=Path)
     parser.add_argument('--output_texts', type=Path, default=Path('texts.txt'))
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--chunksize', type=int, default=256)
     args = parser.parse_args()
 
     extract_text_from_mastodon(
         mastodon_outbox=args.mastodon_outbox,
         output_texts=args.output_texts,
+        streaming=args.streaming,
+        chunksize=args.chunksize,
     )
@@ -1,5 +1,8 @@
 import argparse
+import json
 import re
+import time
+from itertools import islice
 from pathlib import Path
 
 import numpy as np
@@ -37,10 +40,28 @@ def generate(
         doc2vec_model_path: Path,
         max_length: int,
         num_test: int,
+        batchsize: int,
         sampling_maximum: bool,
         output_dir: Path,
         gpu: int,
+        vec_cache_size: int,
+        vec_cache_path: Path,
+        inference_seed: int,
+        engine: str,
+        beam_width: int,
+        length_penalty: float,
+        temperature: float,
+        top_k: int,
+        top_p: float,
+        sampling_seed: int,
+        num_process: int,
+        output_jsonl: Path,
+        quiet: bool,
 ):
+    """
+    :param num_process: vectorize over a process pool while the previous batch is decoded, if more than one
+    :param output_jsonl: write every result to this one file instead of `{i}.txt`
+    """
     output_dir.mkdir(exist_ok=True)
 
     output = output_dir / model_dir.name
@@ -61,6 +82,16 @@ def generate(
         max_length=max_length,
         sampling_maximum=sampling_maximum,
         gpu=gpu,
+        vec_cache_size=vec_cache_size,
+        vec_cache_path=vec_cache_path,
+        inference_seed=inference_seed,
+        engine=engine,
+        beam_width=beam_width,
+        length_penalty=length_penalty,
+        temperature=temperature,
+        top_k=top_k,
+        top_p=top_p,
+        sampling_seed=sampling_seed,
     )
 
     if text_path is None:
@@ -71,17 +102,45 @@ def generate(
     np.random.RandomState(config.dataset.seed).shuffle(texts)
     texts = texts[:num_test]
 
-    for i, text in enumerate(texts):
-        vec = hihobot.text_to_vec(text)
-        out_text = hihobot.generate(
-            vec=vec,
+    output_jsonl_file = output_jsonl.open('w', encoding='utf8') if output_jsonl is not None else None
+
+    vecs = hihobot.iterate_vecs(texts, n_workers=num_process, chunksize=batchsize)
+    for i_batch in range(0, len(texts), batchsize):
+        batch_texts = texts[i_batch:i_batch + batchsize]
+
+        start = time.time()
+        out_texts = hihobot.generate_batch(
+            vecs=np.stack(list(islice(vecs, len(batch_texts)))),
         )
+        batch_decode_time = time.time() - start  # of the whole batch, without the vectorization
+
+        for i, (text, out_text) in enumerate(zip(batch_texts, out_texts), start=i_batch):
+            if not quiet:
+                print('correct:', text)
+                print('predict:', out_text)
+                print('------------------------------------------------')
+
+            if output_jsonl_file is not None:
+                result = dict(
+                    input=text,
+                    output=out_text,
+                    batch_decode_time=batch_decode_time,
+                    checkpoint=str(model_path),
+                )
+                output_jsonl_file.write(json.dumps(result, ensure_ascii=False) + '\n')
+            else:
+                (output / f'{i}.txt').open('w').write(out_text)
+
+        if output_jsonl_file is not None:
+            output_jsonl_file.flush()
 
-        print('correct:', text)
-        print('predict:', out_text)
-        print('------------------------------------------------')
+    vecs.close()
+    if output_jsonl_file is not None:
+        output_jsonl_file.close()
 
-        (output / f'{i}.txt').open('w').write(out_text)
+    vec_cache_stats = hihobot.get_vec_cache_stats()
+    if vec_cache_stats is not None:
+        print('vec cache:', vec_cache_stats)
 
 
 if __name__ == '__main__':
@@ -94,9 +153,23 @@ if __name__ == '__main__':
     parser.add_argument('--doc2vec_model_path', '-dmp', type=Path)
     parser.add_argument('--max_length', '-ml', type=int, default=32)
     parser.add_argument('--num_test', '-nt', type=int, default=50)
+    parser.add_argument('--batchsize', '-bs', type=int, default=1)
     parser.add_argument('--sampling_maximum', '-sm', action='store_true')
     parser.add_argument('--output_dir', '-o', type=Path, default='./output/')
     parser.add_argument('--gpu', type=int)
+    parser.add_argument('--vec_cache_size', type=int, default=0)
+    parser.add_argument('--vec_cache_path', type=Path)
+    parser.add_argument('--inference_seed', type=int)
+    parser.add_argument('--engine', choices=['chainer', 'numpy'], default='chainer')
+    parser.add_argument('--beam_width', '-bw', type=int)
+    parser.add_argument('--length_penalty', '-lp', type=float, default=0.0)
+    parser.add_argument('--temperature', type=float, default=1.0)
+    parser.add_argument('--top_k', type=int)
+    parser.add_argument('--top_p', type=float)
+    parser.add_argument('--sampling_seed', type=int)
+    parser.add_argument('--num_process', '-np', type=int, default=1)
+    parser.add_argument('--output_jsonl', type=Path)
+    parser.add_argument('--quiet', '-q', action='store_true')
     arguments = parser.parse_args()
 
     generate(
@@ -108,7 +181,21 @@ if __name__ == '__main__':
         doc2vec_model_path=arguments.doc2vec_model_path,
         max_length=arguments.max_length,
         num_test=arguments.num_test,
+        batchsize=arguments.batchsize,
         sampling_maximum=arguments.sampling_maximum,
         output_dir=arguments.output_dir,
         gpu=arguments.gpu,
+        vec_cache_size=arguments.vec_cache_size,
+        vec_cache_path=arguments.vec_cache_path,
+        inference_seed=arguments.inference_seed,
+        engine=arguments.engine,
+        beam_width=arguments.beam_width,
+        length_penalty=arguments.length_penalty,
+        temperature=arguments.temperature,
+        top_k=arguments.top_k,
+        top_p=arguments.top_p,
+        sampling_seed=arguments.sampling_seed,
+        num_process=arguments.num_process,
+        output_jsonl=arguments.output_jsonl,
+        quiet=arguments.quiet,
     )
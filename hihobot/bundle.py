@@ -0,0 +1,159 @@
+import io
+import json
+import mmap
+import pickle
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Union
+
+import numpy as np
+
+from hihobot.config import Config, create_from_dict
+from hihobot.numpy_network import NumpyDeepLSTM
+
+_magic = b'HIHOBNDL'
+_version = 1
+_alignment = 64
+
+# arrays smaller than this are kept inside the pickles
+_min_detached_nbytes = 1024
+
+
+class Bundle(NamedTuple):
+    config: Config
+    chars: List[str]
+    predictor: NumpyDeepLSTM
+    doc2vec_model: Any
+
+
+def _align(n: int):
+    return (n + _alignment - 1) // _alignment * _alignment
+
+
+class _DetachingPickler(pickle.Pickler):
+    """
+    pickles large arrays by reference, the arrays are written raw to the bundle
+    """
+
+    def __init__(self, file, arrays: List[np.ndarray]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = arrays
+        self._indices: Dict[int, int] = {}
+
+    def persistent_id(self, obj):
+        if type(obj) not in (np.ndarray, np.memmap) or obj.dtype == object or obj.nbytes < _min_detached_nbytes:
+            return None
+
+        if id(obj) not in self._indices:
+            self._indices[id(obj)] = len(self.arrays)
+            self.arrays.append(np.ascontiguousarray(obj))
+        return self._indices[id(obj)]
+
+
+class _AttachingUnpickler(pickle.Unpickler):
+    def __init__(self, file, arrays: List[np.ndarray]):
+        super().__init__(file)
+        self.arrays = arrays
+
+    def persistent_load(self, pid):
+        return self.arrays[pid]
+
+
+def _drop_document_vectors(doc2vec_model):
+    """
+    the vectors of the training documents are not used to infer a new one
+    """
+    for keyed_vectors_name, vectors_name in (('dv', 'vectors'), ('docvecs', 'vectors_docs')):  # gensim 4, 3
+        keyed_vectors = getattr(doc2vec_model, keyed_vectors_name, None)
+        vectors = getattr(keyed_vectors, vectors_name, None)
+        if isinstance(vectors, np.ndarray):
+            setattr(keyed_vectors, vectors_name, vectors[:0])
+
+
+def save_bundle(
+        path: Path,
+        config: Config,
+        chars: List[str],
+        predictor: NumpyDeepLSTM,
+        doc2vec_model: Any,
+):
+    """
+    layout: magic, header size (uint64), json header, and the raw arrays aligned to 64 bytes.
+    the document vectors of `doc2vec_model` are dropped.
+    """
+    _drop_document_vectors(doc2vec_model)
+
+    arrays: List[np.ndarray] = []
+    objects: Dict[str, bytes] = {}
+    for name, obj in (('predictor', predictor), ('doc2vec_model', doc2vec_model)):
+        f = io.BytesIO()
+        _DetachingPickler(f, arrays).dump(obj)
+        objects[name] = f.getvalue()
+
+    array_entries = []
+    offset = 0
+    for array in arrays:
+        array_entries.append(dict(offset=offset, dtype=array.dtype.str, shape=array.shape))
+        offset = _align(offset + array.nbytes)
+
+    object_entries = {}
+    for name, data in objects.items():
+        object_entries[name] = dict(offset=offset, size=len(data))
+        offset = _align(offset + len(data))
+
+    header = json.dumps(dict(
+        version=_version,
+        config=config.to_dict(),
+        chars=chars,
+        arrays=array_entries,
+        objects=object_entries,
+    ), ensure_ascii=False).encode('utf8')
+
+    with open(path, 'wb') as f:
+        f.write(_magic)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+
+        data_start = _align(f.tell())
+        for array, entry in zip(arrays, array_entries):
+            f.seek(data_start + entry['offset'])
+            f.write(array.data)
+        for name, entry in object_entries.items():
+            f.seek(data_start + entry['offset'])
+            f.write(objects[name])
+
+
+def load_bundle(path: Union[str, Path]):
+    """
+    the arrays are read-only views of one shared mmap, so processes loading the same bundle share the pages.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_magic)) != _magic:
+            raise ValueError(f'{path} is not a bundle')
+        header_size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_size).decode('utf8'))
+        if header['version'] != _version:
+            raise ValueError(f'unsupported bundle version {header["version"]}')
+
+        data_start = _align(len(_magic) + 8 + header_size)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = []
+    for entry in header['arrays']:
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + entry['offset'])
+        arrays.append(array.reshape(entry['shape']))
+
+    objects = {}
+    for name, entry in header['objects'].items():
+        start = data_start + entry['offset']
+        f = io.BytesIO(buffer[start:start + entry['size']])
+        objects[name] = _AttachingUnpickler(f, arrays).load()
+
+    return Bundle(
+        config=create_from_dict(header['config']),
+        chars=header['chars'],
+        predictor=objects['predictor'],
+        doc2vec_model=objects['doc2vec_model'],
+    )
@@ -1,6 +1,6 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, List, NamedTuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 
 from hihobot.utility import JSONEncoder
 
@@ -11,6 +11,8 @@ class DatasetConfig(NamedTuple):
     doc2vec_model_path: str
     seed: int
     num_test: int
+    cache_dir: Optional[str]
+    tokenizer: str
 
 
 class NetworkConfig(NamedTuple):
@@ -19,6 +21,9 @@ class NetworkConfig(NamedTuple):
     hidden_size: int
     out_size: int
     dropout: float
+    char_embed_size: Optional[int]
+    conditioning: str
+    vec_size: Optional[int]
 
 
 class LossConfig(NamedTuple):
@@ -27,8 +32,12 @@ class LossConfig(NamedTuple):
 
 class TrainConfig(NamedTuple):
     batchsize: int
+    max_tokens: Optional[int]
     gpu: List[int]
+    num_cpu_workers: Optional[int]
     log_iteration: int
+    histogram_iteration: Optional[int]
+    histogram_max_size: Optional[int]
     snapshot_iteration: int
     stop_iteration: int
     optimizer: Dict[str, Any]
@@ -49,9 +58,12 @@ class Config(NamedTuple):
     project: ProjectConfig
 
     def save_as_json(self, path):
-        d = _namedtuple_to_dict(self)
+        d = self.to_dict()
         json.dump(d, open(path, 'w'), indent=2, sort_keys=True, cls=JSONEncoder)
 
+    def to_dict(self):
+        return _namedtuple_to_dict(self)
+
 
 def _namedtuple_to_dict(o: NamedTuple):
     return {
@@ -61,7 +73,10 @@ def _namedtuple_to_dict(o: NamedTuple):
 
 
 def create_from_json(s: Union[str, Path]):
-    d = json.load(open(s))
+    return create_from_dict(json.load(open(s)))
+
+
+def create_from_dict(d: Dict[str, Any]):
     backward_compatible(d)
 
     return Config(
@@ -71,6 +86,8 @@ def create_from_json(s: Union[str, Path]):
             doc2vec_model_path=d['dataset']['doc2vec_model_path'],
             seed=d['dataset']['seed'],
             num_test=d['dataset']['num_test'],
+            cache_dir=d['dataset']['cache_dir'],
+            tokenizer=d['dataset']['tokenizer'],
         ),
         network=NetworkConfig(
             n_layers=d['network']['n_layers'],
@@ -78,13 +95,20 @@ def create_from_json(s: Union[str, Path]):
             hidden_size=d['network']['hidden_size'],
             out_size=d['network']['out_size'],
             dropout=d['network']['dropout'],
+            char_embed_size=d['network']['char_embed_size'],
+            conditioning=d['network']['conditioning'],
+            vec_size=d['network']['vec_size'],
         ),
         loss=LossConfig(
         ),
         train=TrainConfig(
             batchsize=d['train']['batchsize'],
+            max_tokens=d['train']['max_tokens'],
             gpu=d['train']['gpu'],
+            num_cpu_workers=d['train']['num_cpu_workers'],
             log_iteration=d['train']['log_iteration'],
+            histogram_iteration=d['train']['histogram_iteration'],
+            histogram_max_size=d['train']['histogram_max_size'],
             snapshot_iteration=d['train']['snapshot_iteration'],
             stop_iteration=d['train']['stop_iteration'],
             optimizer=d['train']['optimizer'],
@@ -99,8 +123,35 @@ def create_from_json(s: Union[str, Path]):
 
 
 def backward_compatible(d: Dict):
+    if 'cache_dir' not in d['dataset']:
+        d['dataset']['cache_dir'] = None
+
+    if 'tokenizer' not in d['dataset']:
+        d['dataset']['tokenizer'] = 'janome_wakati'
+
     if 'dropout' not in d['network']:
         d['network']['dropout'] = 0.2
 
+    if 'char_embed_size' not in d['network']:
+        d['network']['char_embed_size'] = None
+
+    if 'conditioning' not in d['network']:
+        d['network']['conditioning'] = 'concat'
+
+    if 'vec_size' not in d['network']:
+        d['network']['vec_size'] = None
+
     if 'linear_shift' not in d['train']:
         d['train']['linear_shift'] = None
+
+    if 'max_tokens' not in d['train']:
+        d['train']['max_tokens'] = None
+
+    if 'num_cpu_workers' not in d['train']:
+        d['train']['num_cpu_workers'] = None
+
+    if 'histogram_iteration' not in d['train']:
+        d['train']['histogram_iteration'] = d['train']['log_iteration']
+
+    if 'histogram_max_size' not in d['train']:
+        d['train']['histogram_max_size'] = None
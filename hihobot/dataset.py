@@ -1,86 +1,271 @@
+import hashlib
 import json
-from functools import partial
 from pathlib import Path
-from typing import Dict, List, NamedTuple
+from typing import Any, Dict, List, NamedTuple, Optional
 
 import chainer
 import ndjson
 import numpy as np
 
 from hihobot.config import DatasetConfig
+from hihobot.stage_timer import measure
 from hihobot.transoformer import Transformer
+from hihobot.utility import _load_char
 from hihobot.vectorizer import Vectorizer
 
 
 class Data(NamedTuple):
-    input_array: np.ndarray  # shape: (length+1, num_id)
+    input_array: np.ndarray  # shape: (length+1, num_id), or (length+1, ) char ids
     target_ids: np.ndarray  # shape: (length+1, )
     vec: np.ndarray  # shape: (num_vec, )
 
 
-def _load_char(p: Path) -> List[str]:
-    return json.load(p.open(encoding="utf8"))
-
-
 def _load_text(p: Path):
     ds: List[Dict[str, str]] = ndjson.load(p.open(encoding="utf8"))
     return [d['str'] for d in ds]
 
 
+def _create_data(
+        transformer: Transformer,
+        char_ids: List[int],
+        vec: np.ndarray,
+        char_id_input: bool,
+):
+    target_ids = np.array(transformer.push_end_id(char_ids), dtype=np.int32)
+
+    if char_id_input:
+        input_array = np.array(transformer.unshift_start_id(char_ids), dtype=np.int32)
+    else:
+        input_array = np.array([transformer.to_array(char_id) for char_id in char_ids])
+        input_array = transformer.unshift_start_array(input_array)
+
+    return Data(
+        input_array=input_array,
+        target_ids=target_ids,
+        vec=vec,
+    )
+
+
 class CharIdsDataset(chainer.dataset.DatasetMixin):
     def __init__(
             self,
             texts: List[str],
             transformer: Transformer,
             vectorizer: Vectorizer,
+            char_id_input: bool = False,
     ):
         self.texts = texts
         self.transformer = transformer
         self.vectorizer = vectorizer
+        self.char_id_input = char_id_input
 
     def __len__(self):
         return len(self.texts)
 
+    def get_length(self, i):
+        return len(self.texts[i]) + 1
+
     def get_example(self, i):
-        text = self.texts[i]
-        words = self.vectorizer.to_words(text)
-        vec = self.vectorizer.to_vec(words)
+        with measure('get_example'):
+            text = self.texts[i]
+            with measure('tokenize'):
+                words = self.vectorizer.to_words(text)
+            with measure('infer_vector'):
+                vec = self.vectorizer.to_vec(words)
 
-        char_ids = [self.transformer.to_char_id(c) for word in words for c in word]
+            char_ids = [self.transformer.to_char_id(c) for word in words for c in word]
+            return _create_data(self.transformer, char_ids, vec, char_id_input=self.char_id_input)
 
-        target_ids = np.array(self.transformer.push_end_id(char_ids), dtype=np.int32)
 
-        input_array = np.array([self.transformer.to_array(char_id) for char_id in char_ids])
-        input_array = self.transformer.unshift_start_array(input_array)
+def _cache_fingerprint(config: DatasetConfig) -> Dict[str, Any]:
+    def file_hash(p: Path):
+        # in chunks, the text can be larger than the memory
+        h = hashlib.sha1()
+        with p.open('rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
 
-        return Data(
-            input_array=input_array,
-            target_ids=target_ids,
-            vec=vec,
-        )
+    doc2vec_path = Path(config.doc2vec_model_path)
+    doc2vec_files = sorted(doc2vec_path.parent.glob(doc2vec_path.name + '*'))
+    return dict(
+        text=file_hash(Path(config.text_path)),
+        char=file_hash(Path(config.char_path)),
+        doc2vec=[[p.name, p.stat().st_size, p.stat().st_mtime_ns] for p in doc2vec_files],
+        tokenizer=config.tokenizer,
+    )
 
 
-def create(config: DatasetConfig):
+def build_cache(config: DatasetConfig, cache_dir: Path):
+    """
+    tokenize and vectorize all texts once, and save them as flat npy files.
+    the char ids and the vector of a text come from one tokenization.
+    char_ids.npy: all char ids, offsets.npy: (num_text+1, ) boundaries, vecs.npy: (num_text, num_vec)
+    """
     texts = _load_text(Path(config.text_path))
-    np.random.RandomState(config.seed).shuffle(texts)
+    transformer = Transformer(chars=_load_char(Path(config.char_path)))
+    vectorizer = Vectorizer(path_doc2vec_model=config.doc2vec_model_path, tokenizer=config.tokenizer)
 
-    chars = _load_char(Path(config.char_path))
-    transformer = Transformer(chars=chars)
+    char_ids: List[int] = []
+    offsets = [0]
+    vecs = np.empty((len(texts), vectorizer.get_vector_size()), dtype=np.float32)
+    for i, (words, vec) in enumerate(vectorizer.iterate_words_and_vecs(texts)):
+        char_ids += [transformer.to_char_id(c) for word in words for c in word]
+        offsets.append(len(char_ids))
+        vecs[i] = vec
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.save(str(cache_dir / 'char_ids.npy'), np.array(char_ids, dtype=np.int32))
+    np.save(str(cache_dir / 'offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(str(cache_dir / 'vecs.npy'), vecs)
+
+    # written last, so an interrupted build is never taken as fresh
+    json.dump(_cache_fingerprint(config), (cache_dir / 'fingerprint.json').open('w'))
+
+
+def is_fresh_cache(config: DatasetConfig, cache_dir: Path):
+    p = cache_dir / 'fingerprint.json'
+    return p.exists() and json.load(p.open()) == _cache_fingerprint(config)
+
+
+class CachedCharIdsDataset(chainer.dataset.DatasetMixin):
+    def __init__(
+            self,
+            indices: List[int],
+            cache_dir: Path,
+            transformer: Transformer,
+            char_id_input: bool = False,
+    ):
+        self.indices = indices
+        self.cache_dir = cache_dir
+        self.transformer = transformer
+        self.char_id_input = char_id_input
+
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def _get_arrays(self):
+        # opened lazily, so every process maps the same pages instead of holding a copy
+        if self._arrays is None:
+            self._arrays = {
+                name: np.load(str(self.cache_dir / f'{name}.npy'), mmap_mode='r')
+                for name in ('char_ids', 'offsets', 'vecs')
+            }
+        return self._arrays
+
+    def __len__(self):
+        return len(self.indices)
+
+    def get_length(self, i):
+        offsets = self._get_arrays()['offsets']
+        j = self.indices[i]
+        return int(offsets[j + 1] - offsets[j]) + 1
+
+    def get_example(self, i):
+        with measure('get_example'):
+            arrays = self._get_arrays()
+            j = self.indices[i]
 
-    vectorizer = Vectorizer(path_doc2vec_model=config.doc2vec_model_path)
+            start, end = arrays['offsets'][j], arrays['offsets'][j + 1]
+            char_ids = arrays['char_ids'][start:end].tolist()
+            vec = np.array(arrays['vecs'][j])
+            return _create_data(self.transformer, char_ids, vec, char_id_input=self.char_id_input)
+
+
+def split_indices(config: DatasetConfig, num_text: int) -> Dict[str, List[int]]:
+    """
+    indices of the texts in each split, shuffled by the seed of the config
+    """
+    indices = list(range(num_text))
+    np.random.RandomState(config.seed).shuffle(indices)
 
     num_test = config.num_test
-    trains = texts[num_test:]
-    tests = texts[:num_test]
+    trains = indices[num_test:]
+    tests = indices[:num_test]
     evals = trains[:num_test]
+    return {
+        'train': trains,
+        'test': tests,
+        'train_eval': evals,
+    }
 
-    _Dataset = partial(
-        CharIdsDataset,
-        transformer=transformer,
-        vectorizer=vectorizer,
-    )
+
+def create(config: DatasetConfig, char_id_input: bool = False):
+    texts = _load_text(Path(config.text_path))
+
+    chars = _load_char(Path(config.char_path))
+    transformer = Transformer(chars=chars)
+
+    splits = split_indices(config, len(texts))
+
+    if config.cache_dir is not None:
+        cache_dir = Path(config.cache_dir)
+        if not is_fresh_cache(config, cache_dir):
+            build_cache(config, cache_dir)
+
+        return {
+            name: CachedCharIdsDataset(
+                indices,
+                cache_dir=cache_dir,
+                transformer=transformer,
+                char_id_input=char_id_input,
+            )
+            for name, indices in splits.items()
+        }
+
+    vectorizer = Vectorizer(path_doc2vec_model=config.doc2vec_model_path, tokenizer=config.tokenizer)
     return {
-        'train': _Dataset(trains),
-        'test': _Dataset(tests),
-        'train_eval': _Dataset(evals),
+        name: CharIdsDataset(
+            [texts[i] for i in indices],
+            transformer=transformer,
+            vectorizer=vectorizer,
+            char_id_input=char_id_input,
+        )
+        for name, indices in splits.items()
     }
+
+
+def create_test(config: DatasetConfig, cache_path: Path, char_id_input: bool = False) -> List[Data]:
+    """
+    only the examples of the test split, without vectorizing the other texts.
+    the dataset cache is used if it is fresh, else the test vectors are saved to `cache_path`,
+    so every call gives the same vectors.
+    """
+    texts = _load_text(Path(config.text_path))
+    transformer = Transformer(chars=_load_char(Path(config.char_path)))
+    indices = split_indices(config, len(texts))['test']
+
+    if config.cache_dir is not None and is_fresh_cache(config, Path(config.cache_dir)):
+        dataset = CachedCharIdsDataset(
+            indices,
+            cache_dir=Path(config.cache_dir),
+            transformer=transformer,
+            char_id_input=char_id_input,
+        )
+        return [dataset[i] for i in range(len(dataset))]
+
+    texts = [texts[i] for i in indices]
+    vectorizer = Vectorizer(path_doc2vec_model=config.doc2vec_model_path, tokenizer=config.tokenizer)
+
+    fingerprint = json.dumps(dict(_cache_fingerprint(config), seed=config.seed, num_test=config.num_test))
+    if cache_path.exists() and str(np.load(str(cache_path))['fingerprint']) == fingerprint:
+        words_list = list(vectorizer.to_words_many(texts))
+        vecs = np.load(str(cache_path))['vecs']
+    else:
+        words_list, vecs = [], np.empty((len(texts), vectorizer.get_vector_size()), dtype=np.float32)
+        for i, (words, vec) in enumerate(vectorizer.iterate_words_and_vecs(texts)):
+            words_list.append(words)
+            vecs[i] = vec
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with cache_path.open('wb') as f:
+            np.savez(f, vecs=vecs, fingerprint=fingerprint)
+
+    examples = []
+    for words, vec in zip(words_list, vecs):
+        char_ids = [transformer.to_char_id(c) for word in words for c in word]
+        examples.append(_create_data(transformer, char_ids, vec, char_id_input=char_id_input))
+    return examples
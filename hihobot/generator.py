@@ -1,14 +1,23 @@
+from contextlib import ExitStack
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
 
-import chainer
-import chainer.functions as F
 import numpy as np
-from chainer import cuda
 
 from hihobot.config import Config
-from hihobot.model import create_predictor
+from hihobot.numpy_network import NumpyDeepLSTM
 from hihobot.transoformer import Transformer
 
+if TYPE_CHECKING:
+    import chainer
+
+
+def _to_array(x):
+    """
+    the array of a chainer.Variable, without importing chainer for the numpy engine
+    """
+    return x.array if hasattr(x, 'array') else x
+
 
 class Generator(object):
     def __init__(
@@ -17,72 +26,289 @@ class Generator(object):
             model_path: Path,
             transformer: Transformer,
             gpu: int = None,
+            engine: str = 'chainer',
+            predictor: Any = None,
     ) -> None:
+        """
+        :param engine: 'chainer', or 'numpy' for a chainer-free inference on cpu
+        :param predictor: an already loaded predictor of the engine, e.g. from a bundle, instead of `model_path`
+        """
         self.config = config
         self.model_path = model_path
         self.gpu = gpu
 
         self.transformer = transformer
         self.num_id = self.transformer.get_num_id()
+        self.char_id_input = config.network.char_embed_size is not None
 
-        self.predictor = predictor = create_predictor(config.network, train=False)
-        chainer.serializers.load_npz(str(model_path), predictor)
+        self.engine = engine
+        if engine == 'numpy':
+            if gpu is not None:
+                raise ValueError('numpy engine runs on cpu only')
+            if predictor is None:
+                predictor = NumpyDeepLSTM.load(config.network, model_path)
+            self.predictor = predictor
+        elif engine == 'chainer':
+            import chainer
+            from hihobot.model import create_predictor
 
-        if self.gpu is not None:
-            predictor.to_gpu(self.gpu)
-            cuda.get_device_from_id(self.gpu).use()
+            if predictor is None:
+                predictor = create_predictor(config.network, train=False)
+                chainer.serializers.load_npz(str(model_path), predictor)
+            self.predictor = predictor
 
-        chainer.global_config.train = False
-        chainer.global_config.enable_backprop = False
+            if self.gpu is not None:
+                predictor.to_gpu(self.gpu)
+                chainer.cuda.get_device_from_id(self.gpu).use()
+        else:
+            raise ValueError(engine)
+
+    def _inference_mode(self):
+        stack = ExitStack()
+        if self.engine == 'chainer':
+            import chainer
+            stack.enter_context(chainer.using_config('train', False))
+            stack.enter_context(chainer.using_config('enable_backprop', False))
+        return stack
+
+    def _to_cpu(self, x):
+        if self.gpu is None:
+            return x
+        from chainer import cuda
+        return cuda.to_cpu(x)
 
     def generate(
             self,
             vec: np.ndarray,  # shape: (num_vec, )
             max_length: int,
             sampling_maximum: bool,
+            **sampling_kwargs,
     ):
-        vec = self.predictor.xp.asarray(vec)
+        return self.generate_batch(
+            vecs=vec[np.newaxis],
+            max_length=max_length,
+            sampling_maximum=sampling_maximum,
+            **sampling_kwargs,
+        )[0]
 
-        hs = None
-        cs = None
-        x = self.predictor.xp.asarray(self.transformer.get_start_array())  # shape: (num_char, )
+    def generate_batch(
+            self,
+            vecs: np.ndarray,  # shape: (batch, num_vec)
+            max_length: int,
+            sampling_maximum: bool,
+            temperature: float = 1.0,
+            top_k: Optional[int] = None,
+            top_p: Optional[float] = None,
+            random_state: Union[np.random.RandomState, np.random.Generator] = None,
+    ):
+        """
+        :param temperature, top_k, top_p, random_state: see `sampling`
+        """
+        with self._inference_mode():
+            return self._generate_batch(
+                vecs,
+                max_length=max_length,
+                sampling_maximum=sampling_maximum,
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
+                random_state=random_state,
+            )
 
-        text = ""
+    def _get_start_input(self, batch_size: int):
+        """
+        :return: shape: (batch, ) char ids or (batch, num_char) arrays
+        """
+        xp = self.predictor.xp
+        if self.char_id_input:
+            return xp.full(batch_size, self.transformer.get_start_id(), dtype=np.int32)
+        return xp.asarray(self.transformer.get_start_arrays(batch_size))
+
+    def _to_input(self, char_ids: np.ndarray):
+        """
+        :param char_ids: shape: (batch, )
+        :return: shape: (batch, ) char ids or (batch, num_char) arrays
+        """
+        xp = self.predictor.xp
+        if self.char_id_input:
+            return xp.asarray(char_ids)
+        return xp.asarray(self.transformer.to_arrays(char_ids))
+
+    def _generate_batch(
+            self,
+            vecs: np.ndarray,  # shape: (batch, num_vec)
+            max_length: int,
+            sampling_maximum: bool,
+            **sampling_kwargs,
+    ):
+        xp = self.predictor.xp
+        vecs = xp.asarray(vecs)
+        batch_size = len(vecs)
+        end_id = self.transformer.get_end_id()
+
+        hs, cs, v = self.predictor.initial_state(vecs)
+        x = self._get_start_input(batch_size)
+
+        char_ids_list = []
+        finished = np.zeros(batch_size, dtype=bool)
         for i in range(max_length):
-            x = F.expand_dims(F.concat([x, vec], axis=0), axis=0)  # shape: (1, num_id+num_vec)
+            hs, cs, x = self.predictor.forward_one(
+                hs=hs,
+                cs=cs,
+                x=x,
+                v=v,
+            )
+
+            char_ids = self._to_cpu(self.sampling(x, maximum=sampling_maximum, **sampling_kwargs)).astype(np.int32)
+            char_ids[finished] = end_id
+            finished |= char_ids == end_id
+            if finished.all():
+                break
+
+            char_ids_list.append(char_ids)
+            x = self._to_input(char_ids)
 
+        texts = [""] * batch_size
+        for char_ids in char_ids_list:
+            for i in np.flatnonzero(char_ids != end_id):
+                texts[i] += self.transformer.to_char(int(char_ids[i]))
+        return texts
+
+    def beam_search_batch(
+            self,
+            vecs: np.ndarray,  # shape: (batch, num_vec)
+            beam_width: int,
+            max_length: int,
+            length_penalty: float = 0.0,
+    ):
+        """
+        all beams of all vectors are decoded by one `forward_one` call per step.
+        :param length_penalty: alpha of the GNMT length penalty ((5 + length) / 6) ** alpha
+        """
+        with self._inference_mode():
+            return self._beam_search_batch(
+                vecs,
+                beam_width=beam_width,
+                max_length=max_length,
+                length_penalty=length_penalty,
+            )
+
+    def _beam_search_batch(
+            self,
+            vecs: np.ndarray,  # shape: (batch, num_vec)
+            beam_width: int,
+            max_length: int,
+            length_penalty: float,
+    ):
+        xp = self.predictor.xp
+        vecs = xp.asarray(vecs)
+        batch_size = len(vecs)
+        end_id = self.transformer.get_end_id()
+
+        def gather(a, rows, axis):
+            if a is None:
+                return None
+            a = _to_array(a)
+            return a[:, rows] if axis == 1 else a[rows]
+
+        # rows are ordered (batch, beam)
+        rows = np.repeat(np.arange(batch_size), beam_width)
+        hs, cs, v = self.predictor.initial_state(vecs)
+        hs, cs, v = gather(hs, rows, axis=1), gather(cs, rows, axis=1), gather(v, rows, axis=0)
+        x = self._get_start_input(batch_size * beam_width)
+
+        # only the first beam is alive at the start, or every beam would find the same words
+        scores = np.full((batch_size, beam_width), -np.inf, dtype=np.float32)
+        scores[:, 0] = 0
+        finished = np.zeros(batch_size * beam_width, dtype=bool)
+        lengths = np.zeros(batch_size * beam_width, dtype=np.int32)
+        history = np.zeros((batch_size * beam_width, 0), dtype=np.int32)
+
+        for i in range(max_length):
             hs, cs, x = self.predictor.forward_one(
                 hs=hs,
                 cs=cs,
                 x=x,
+                v=v,
             )
 
-            char_id = int(self.sampling(x, maximum=sampling_maximum))
-            if char_id == self.transformer.get_end_id():
+            x = _to_array(x)
+            log_prob = x - xp.max(x, axis=1, keepdims=True)
+            log_prob -= xp.log(xp.sum(xp.exp(log_prob), axis=1, keepdims=True))  # shape: (batch*beam, num_id)
+
+            # a finished beam only continues with the end id, keeping its score
+            finished_xp = xp.asarray(finished)
+            log_prob[finished_xp] = -np.inf
+            log_prob[finished_xp, end_id] = 0
+
+            candidate = xp.asarray(scores).reshape(-1, 1) + log_prob
+            candidate = candidate.reshape(batch_size, beam_width * self.num_id)
+            top = xp.argsort(-candidate, axis=1)[:, :beam_width]  # shape: (batch, beam)
+
+            scores = self._to_cpu(xp.take_along_axis(candidate, top, axis=1))
+            top = self._to_cpu(top)
+            parents = (np.arange(batch_size)[:, np.newaxis] * beam_width + top // self.num_id).ravel()
+            char_ids = (top % self.num_id).ravel().astype(np.int32)
+
+            history = np.concatenate([history[parents], char_ids[:, np.newaxis]], axis=1)
+            lengths = lengths[parents] + (~finished[parents] & (char_ids != end_id))
+            finished = finished[parents] | (char_ids == end_id)
+            if finished.all():
                 break
 
-            x = self.predictor.xp.asarray(self.transformer.to_array(char_id))
+            hs, cs = gather(hs, parents, axis=1), gather(cs, parents, axis=1)
+            x = self._to_input(char_ids)
 
-            char = self.transformer.to_char(char_id)
-            text += char
+        normalized = scores / (((5 + lengths) / 6) ** length_penalty).reshape(batch_size, beam_width)
+        best = np.arange(batch_size) * beam_width + np.argmax(normalized, axis=1)
 
-        return text
+        texts = []
+        for char_ids, length in zip(history[best], lengths[best]):
+            texts.append("".join(self.transformer.to_char(int(char_id)) for char_id in char_ids[:length]))
+        return texts
 
-    def sampling(self, softmax_dist: chainer.Variable, maximum=True):
+    def sampling(
+            self,
+            softmax_dist: Union['chainer.Variable', np.ndarray],
+            maximum=True,
+            temperature: float = 1.0,
+            top_k: Optional[int] = None,
+            top_p: Optional[float] = None,
+            random_state: Union[np.random.RandomState, np.random.Generator] = None,
+    ):
         """
+        samples all rows at once by the inverse of the cumulative distribution.
         :param softmax_dist: shape: (batch, num_id)
+        :param top_k: keep only the k most probable ids
+        :param top_p: keep only the most probable ids whose cumulative probability reaches p
+        :param random_state: noise source for reproducible runs, the global one of numpy or cupy if None
         :return: shape: (batch, )
         """
         xp = self.predictor.xp
+        logits = _to_array(softmax_dist)
 
         if maximum:
-            sampled = xp.argmax(softmax_dist.data, axis=1)
+            return xp.argmax(logits, axis=1)
+
+        logits = logits / temperature
+
+        if top_k is not None and top_k < logits.shape[1]:
+            kth = xp.partition(logits, -top_k, axis=1)[:, -top_k, np.newaxis]
+            logits = xp.where(logits < kth, -np.inf, logits)
+
+        if top_p is not None:
+            sorted_logits = -xp.sort(-logits, axis=1)
+            prob = xp.exp(sorted_logits - sorted_logits[:, :1])
+            prob /= prob.sum(axis=1, keepdims=True)
+            num_keep = xp.maximum(((xp.cumsum(prob, axis=1) - prob) < top_p).sum(axis=1), 1)  # the first is always kept
+            threshold = sorted_logits[xp.arange(len(logits)), num_keep - 1][:, np.newaxis]
+            logits = xp.where(logits < threshold, -np.inf, logits)
+
+        cumulative = xp.cumsum(xp.exp(logits - logits.max(axis=1, keepdims=True)), axis=1)
+
+        if random_state is not None:
+            uniform = xp.asarray(random_state.random(size=(len(logits), 1)), dtype=logits.dtype)
         else:
-            prob_np = lambda x: x if isinstance(x, np.ndarray) else x.get()  # cupy don't have random.choice method
-
-            prob_list = F.softmax(softmax_dist)
-            sampled = xp.array([
-                np.random.choice(np.arange(self.num_id), p=prob_np(prob))
-                for prob in prob_list.data
-            ])
-        return sampled
+            uniform = xp.random.random(size=(len(logits), 1)).astype(logits.dtype)
+        # a uniform close to 1 can round up to the total, which would count every id
+        return xp.minimum((cumulative <= uniform * cumulative[:, -1:]).sum(axis=1), logits.shape[1] - 1)
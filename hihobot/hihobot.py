@@ -1,32 +1,73 @@
+import os
+import warnings
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional
 
 import numpy as np
 
+from hihobot.bundle import load_bundle
 from hihobot.config import create_from_json as create_config
-from hihobot.dataset import _load_char
 from hihobot.generator import Generator
 from hihobot.transoformer import Transformer
+from hihobot.utility import _load_char
+from hihobot.vector_cache import VectorCache
 from hihobot.vectorizer import Vectorizer
 
 
 class Hihobot(object):
     def __init__(
             self,
-            model_path: Path,
-            model_config: Path,
-            char_path: Path,
-            doc2vec_model_path: Path,
+            model_path: Optional[Path],
+            model_config: Optional[Path],
+            char_path: Optional[Path],
+            doc2vec_model_path: Optional[Path],
             max_length: int,
             sampling_maximum: bool,
             gpu: Optional[int],
+            vec_cache_size: int = 0,
+            vec_cache_path: Optional[Path] = None,
+            inference_seed: Optional[int] = None,
+            engine: str = 'chainer',
+            beam_width: Optional[int] = None,
+            length_penalty: float = 0.0,
+            temperature: float = 1.0,
+            top_k: Optional[int] = None,
+            top_p: Optional[float] = None,
+            sampling_seed: Optional[int] = None,
+            bundle_path: Optional[Path] = None,
     ):
+        """
+        :param beam_width: decode by beam search instead of sampling when given
+        :param bundle_path: load everything from a bundle made by `make_bundle.py` instead of the other paths
+        """
         self._max_length = max_length
         self._sampling_maximum = sampling_maximum
+        self._sampling_kwargs = dict(
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            random_state=np.random.RandomState(sampling_seed) if sampling_seed is not None else None,
+        )
+        self._beam_width = beam_width
+        self._length_penalty = length_penalty
+
+        if bundle_path is not None:
+            if engine != 'numpy':
+                raise ValueError('a bundle runs on the numpy engine')
+
+            bundle = load_bundle(bundle_path)
+            config, chars, predictor, doc2vec_model = bundle
+            model_path = path_doc2vec_model = bundle_path
+        else:
+            config = create_config(model_config)
+            chars = _load_char(char_path if char_path is not None else Path(config.dataset.char_path))
+            predictor = doc2vec_model = None
 
-        config = create_config(model_config)
+            if doc2vec_model_path is not None:
+                path_doc2vec_model = doc2vec_model_path
+            else:
+                path_doc2vec_model = config.dataset.doc2vec_model_path
 
-        chars = _load_char(char_path if char_path is not None else Path(config.dataset.char_path))
         transformer = Transformer(chars=chars)
 
         self._generator = Generator(
@@ -34,26 +75,102 @@ class Hihobot(object):
             model_path,
             transformer=transformer,
             gpu=gpu,
+            engine=engine,
+            predictor=predictor,
         )
         print(f'Loaded generator "{model_path}"')
 
-        if doc2vec_model_path is not None:
-            path_doc2vec_model = doc2vec_model_path
-        else:
-            path_doc2vec_model = config.dataset.doc2vec_model_path,
+        self._vec_cache: Optional[VectorCache] = None
+        if vec_cache_size > 0 or vec_cache_path is not None:
+            # cached and freshly inferred vectors only agree with a fixed seed
+            if inference_seed is None:
+                inference_seed = 0
+
+            # doc2vec seeds the initial document vector with the builtin hash()
+            if vec_cache_path is not None and 'PYTHONHASHSEED' not in os.environ:
+                warnings.warn('set PYTHONHASHSEED to share the vector cache store between processes')
+
+            self._vec_cache = VectorCache(
+                max_size=vec_cache_size,
+                path=vec_cache_path,
+                namespace=f'{Path(path_doc2vec_model).absolute()}:{inference_seed}:{config.dataset.tokenizer}',
+            )
+
         self._vectorizer = Vectorizer(
-            path_doc2vec_model=path_doc2vec_model
+            path_doc2vec_model=path_doc2vec_model if doc2vec_model is None else None,
+            inference_seed=inference_seed,
+            tokenizer=config.dataset.tokenizer,
+            doc2vec_model=doc2vec_model,
         )
 
-    def text_to_vec(self, text: str):
+    @classmethod
+    def from_bundle(
+            cls,
+            bundle_path: Path,
+            max_length: int,
+            sampling_maximum: bool,
+            **kwargs,
+    ):
+        """
+        :param kwargs: the other options of `__init__`
+        """
+        return cls(
+            model_path=None,
+            model_config=None,
+            char_path=None,
+            doc2vec_model_path=None,
+            max_length=max_length,
+            sampling_maximum=sampling_maximum,
+            gpu=None,
+            engine='numpy',
+            bundle_path=bundle_path,
+            **kwargs,
+        )
+
+    def _text_to_vec(self, text: str):
         words = self._vectorizer.to_words(text)
         vec = self._vectorizer.to_vec(words)
         return vec
 
+    def text_to_vec(self, text: str):
+        if self._vec_cache is None:
+            return self._text_to_vec(text)
+        return self._vec_cache.get(text, self._text_to_vec)
+
+    def iterate_vecs(self, texts: Iterable[str], n_workers: int = 1, chunksize: int = 100) -> Iterator[np.ndarray]:
+        """
+        vectorize texts in order, over a process pool of `n_workers` if more than one.
+        the vector cache is only used without the pool.
+        """
+        if n_workers == 1:
+            for text in texts:
+                yield self.text_to_vec(text)
+            return
+
+        yield from self._vectorizer.iterate_vecs(texts, n_workers=n_workers, chunksize=chunksize)
+
+    def get_vec_cache_stats(self):
+        return self._vec_cache.get_stats() if self._vec_cache is not None else None
+
     def generate(self, vec: np.ndarray):
-        out_text = self._generator.generate(
-            vec=vec,
-            max_length=self._max_length,
-            sampling_maximum=self._sampling_maximum,
-        )
-        return out_text
+        return self.generate_batch(vec[np.newaxis])[0]
+
+    def generate_batch(self, vecs: np.ndarray) -> List[str]:
+        """
+        :param vecs: shape: (batch, num_vec)
+        """
+        if self._beam_width is not None:
+            out_texts = self._generator.beam_search_batch(
+                vecs=vecs,
+                beam_width=self._beam_width,
+                max_length=self._max_length,
+                length_penalty=self._length_penalty,
+            )
+        else:
+            out_texts = self._generator.generate_batch(
+                vecs=vecs,
+                max_length=self._max_length,
+                sampling_maximum=self._sampling_maximum,
+                **self._sampling_kwargs,
+            )
+        return out_texts
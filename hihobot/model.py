@@ -1,11 +1,14 @@
-from typing import List
+from pathlib import Path
+from typing import List, Optional
 
 import chainer
 import chainer.functions as F
+import numpy as np
 from chainer import Chain
 
 from hihobot.config import LossConfig, NetworkConfig
 from hihobot.network import DeepLSTM
+from hihobot.stage_timer import measure
 
 
 def create_predictor(config: NetworkConfig, train=True):
@@ -15,10 +18,49 @@ def create_predictor(config: NetworkConfig, train=True):
         hidden_size=config.hidden_size,
         out_size=config.out_size,
         dropout=config.dropout if train else 0.0,
+        char_embed_size=config.char_embed_size,
+        conditioning=config.conditioning,
+        vec_size=config.vec_size,
     )
     return predictor
 
 
+def convert_one_hot_predictor(config: NetworkConfig, model_path: Path):
+    """
+    load a one-hot input predictor and convert it to the equivalent char id input predictor.
+    the embedding is an identity matrix, so `char_embed_size` becomes `num_char`.
+    :return: converted predictor and its network config
+    >>> import tempfile
+    >>> config = NetworkConfig(
+    ...     n_layers=1, in_size=4, hidden_size=8, out_size=5, dropout=0.0, char_embed_size=None,
+    ...     conditioning='add', vec_size=3,
+    ... )
+    >>> one_hot_predictor = create_predictor(config, train=False)
+    >>> path = Path(tempfile.mkdtemp()) / 'predictor.npz'
+    >>> chainer.serializers.save_npz(str(path), one_hot_predictor)
+    >>> predictor, _ = convert_one_hot_predictor(config, path)
+    >>> char_ids = np.array([-1, 2, 0, 3], dtype=np.int32)
+    >>> one_hot = np.concatenate([np.zeros((1, 4)), np.eye(4)[char_ids[1:]]]).astype(np.float32)
+    >>> vec = np.ones((1, 3), dtype=np.float32)
+    >>> with chainer.using_config('train', False):
+    ...     expected = one_hot_predictor([one_hot], vec)[0].array
+    ...     actual = predictor([char_ids], vec)[0].array
+    >>> np.allclose(expected, actual)
+    True
+    """
+    one_hot_predictor = create_predictor(config, train=False)
+    chainer.serializers.load_npz(str(model_path), one_hot_predictor)
+
+    num_char = config.out_size - 1
+    config = config._replace(char_embed_size=num_char)
+
+    predictor = create_predictor(config, train=False)
+    for link in one_hot_predictor.children():
+        getattr(predictor, link.name).copyparams(link)
+    predictor.embed.W.array[...] = np.eye(config.out_size, num_char, dtype=np.float32)
+    return predictor, config
+
+
 class Model(Chain):
     def __init__(self, loss_config: LossConfig, predictor: DeepLSTM) -> None:
         super().__init__()
@@ -28,21 +70,24 @@ class Model(Chain):
 
     def __call__(
             self,
-            input_array: List[chainer.Variable],  # shape: List[(length+1, num_id)]
+            input_array: List[chainer.Variable],  # shape: List[(length+1, num_id)] or List[(length+1, )]
             target_ids: List[chainer.Variable],  # shape: List[(length+1, )]
             vec: List[chainer.Variable],  # shape: List[(num_vec, )]
+            sections: Optional[np.ndarray] = None,
     ):
-        input = [
-            F.concat([ia, F.repeat(F.expand_dims(v, axis=0), len(ia), axis=0)], axis=1)
-            for ia, v in zip(input_array, vec)
-        ]  # shape: List[(length+1, num_id+num_vec)]
-
-        output = self.predictor(input)  # shape: List[(length+1, ?)]
-
-        output = F.concat(output, axis=0)  # shape: (all_length, ?)
-        target = F.concat(target_ids, axis=0)  # shape: (all_length, )
+        """
+        :param sections: the boundaries between the sequences, when the fields are packed by `PackedConverter`:
+            input_array: (all_length, num_id) or (all_length, ), target_ids: (all_length, ), vec: (batch, num_vec)
+        """
+        if sections is None:
+            vec = F.stack(vec)
+            target_ids = F.concat(target_ids, axis=0)  # shape: (all_length, )
 
-        loss = F.softmax_cross_entropy(output, target)
+        with measure('forward' if chainer.config.enable_backprop else 'evaluate', count=len(target_ids)):
+            output = self.predictor(input_array, vec, sections=sections)
+            if sections is None:
+                output = F.concat(output, axis=0)  # shape: (all_length, ?)
+            loss = F.softmax_cross_entropy(output, target_ids)
 
         chainer.report(dict(
             loss=loss,
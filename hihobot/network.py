@@ -7,10 +7,41 @@ import numpy as np
 
 
 class DeepLSTM(chainer.Chain):
-    def __init__(self, n_layers: int, in_size: int, hidden_size: int, out_size: int, dropout: float):
+    def __init__(
+            self,
+            n_layers: int,
+            in_size: int,
+            hidden_size: int,
+            out_size: int,
+            dropout: float,
+            char_embed_size: int = None,
+            conditioning: str = 'concat',
+            vec_size: int = None,
+    ):
+        """
+        :param conditioning: how the conditioning vector enters the network.
+            concat: concatenated to the input of every step.
+            add: projected to the input size once per sequence, and added to the input of every step.
+            state: projected to the initial hidden and cell states.
+        """
         super().__init__()
+        self.n_layers = n_layers
+        self.hidden_size = hidden_size
+        self.char_embed_size = char_embed_size
+        self.conditioning = conditioning
 
         with self.init_scope():
+            if char_embed_size is not None:
+                # the start id (-1) is embedded to a zero vector like the one-hot start array
+                self.embed = L.EmbedID(in_size=out_size, out_size=char_embed_size, ignore_label=-1)
+
+            if conditioning == 'add':
+                self.vec_linear = L.Linear(in_size=vec_size, out_size=in_size)
+            elif conditioning == 'state':
+                self.vec_linear = L.Linear(in_size=vec_size, out_size=2 * n_layers * hidden_size)
+            elif conditioning != 'concat':
+                raise ValueError(conditioning)
+
             self.lstm = L.NStepLSTM(
                 n_layers=n_layers,
                 in_size=in_size,
@@ -19,18 +50,88 @@ class DeepLSTM(chainer.Chain):
             )
             self.post_linear = L.Linear(in_size=hidden_size, out_size=out_size)
 
-    def __call__(self, xs: List[Union[chainer.Variable, np.ndarray]]):
+    def embed_input(self, x: Union[chainer.Variable, np.ndarray]):
+        """
+        :param x: shape: (batch, num_char) one-hot arrays or (batch, ) char ids
+        :return: shape: (batch, ?)
+        """
+        if self.char_embed_size is None:
+            return x
+        return self.embed(x)
+
+    def embed_inputs(self, xs: List[Union[chainer.Variable, np.ndarray]]):
+        """
+        :param xs: shape: List[(length, num_char)] one-hot arrays or List[(length, )] char ids
+        :return: shape: List[(length, ?)]
+        """
+        if self.char_embed_size is None:
+            return xs
+
+        sections = np.cumsum([len(x) for x in xs])[:-1]
+        x = self.embed(F.concat(xs, axis=0))  # shape: (all_length, ?)
+        return F.split_axis(x, sections, axis=0)
+
+    def initial_state(self, vecs: Union[chainer.Variable, np.ndarray]):
         """
-        :param xs:  # shape: List[(length, ?)]
+        :param vecs: shape: (batch, num_vec)
+        :return:
+            hs: shape: (n_layers, batch, hidden_size) or None
+            cs: shape: (n_layers, batch, hidden_size) or None
+            v: shape: (batch, ?) or None, the term injected to the input of every step
         """
-        _, _, hs = self.lstm(hx=None, cx=None, xs=xs)  # shape: List[(length, ?)]
+        if self.conditioning == 'concat':
+            return None, None, vecs
+
+        if self.conditioning == 'add':
+            return None, None, self.vec_linear(vecs)
 
-        sections = np.cumsum([len(h) for h in hs])
+        state = F.reshape(self.vec_linear(vecs), (len(vecs), 2, self.n_layers, self.hidden_size))
+        state = F.transpose(state, (1, 2, 0, 3))  # shape: (2, n_layers, batch, hidden_size)
+        hs, cs = F.separate(state, axis=0)
+        return hs, cs, None
+
+    def _inject(self, x: Union[chainer.Variable, np.ndarray], v: Optional[chainer.Variable]):
+        """
+        :param x: shape: (length, ?)
+        :param v: shape: (?, ) or (length, ?)
+        """
+        if self.conditioning == 'concat':
+            return F.concat([x, F.broadcast_to(v, (len(x), v.shape[-1]))], axis=1)
+        if self.conditioning == 'add':
+            return x + F.broadcast_to(v, x.shape)
+        return x
+
+    def __call__(
+            self,
+            xs: Union[List[Union[chainer.Variable, np.ndarray]], chainer.Variable, np.ndarray],
+            vecs: Union[chainer.Variable, np.ndarray],
+            sections: Optional[np.ndarray] = None,
+    ):
+        """
+        :param xs: shape: List[(length, num_char)] one-hot arrays or List[(length, )] char ids,
+            or all of them concatenated, (all_length, num_char) or (all_length, ), with `sections`
+        :param vecs: shape: (batch, num_vec)
+        :param sections: the boundaries between the sequences in the concatenated `xs`
+        :return: shape: List[(length, num_id)], or (all_length, num_id) with `sections`
+        """
+        if sections is None:
+            xs = self.embed_inputs(xs)
+        else:
+            xs = F.split_axis(self.embed_input(xs), sections, axis=0)
+
+        hx, cx, v = self.initial_state(vecs)
+        if v is not None:
+            xs = [self._inject(x, v_one) for x, v_one in zip(xs, F.separate(v, axis=0))]
+
+        _, _, hs = self.lstm(hx=hx, cx=cx, xs=xs)  # shape: List[(length, ?)]
+        lengths = [len(h) for h in hs]
 
         hs = F.concat(hs, axis=0)  # shape: (all_length, ?)
         hs = self.post_linear(hs)  # shape: (all_length, num_id)
+        if sections is not None:
+            return hs
 
-        hs = F.split_axis(hs, sections, axis=0)  # shape: List[(length, num_id)]
+        hs = F.split_axis(hs, np.cumsum(lengths)[:-1], axis=0)  # shape: List[(length, num_id)]
         return hs
 
     def forward_one(
@@ -38,16 +139,21 @@ class DeepLSTM(chainer.Chain):
             hs: Optional[chainer.Variable],
             cs: Optional[chainer.Variable],
             x: Union[np.ndarray, chainer.Variable],
+            v: Optional[chainer.Variable],
     ):
         """
         :param hs:
         :param cs:
-        :param x: shape: (batch, ?)
+        :param x: shape: (batch, num_char) one-hot arrays or (batch, ) char ids
+        :param v: shape: (batch, ?), the term given by `initial_state`
         :return:
             hs:
             cs:
             x: shape: (batch, num_id)
         """
+        x = self.embed_input(x)
+        x = self._inject(x, v)
+
         x = F.expand_dims(x, axis=1)  # shape: (batch, 1, ?)
         xs = F.separate(x, axis=0)  # shape: List[(1, ?)]
         hs, cs, xs = self.lstm(hx=hs, cx=cs, xs=xs)  # shape: List[(1, ?)]
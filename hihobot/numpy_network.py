@@ -0,0 +1,130 @@
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from hihobot.config import NetworkConfig
+
+
+def _sigmoid(x: np.ndarray):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+class NumpyDeepLSTM(object):
+    """
+    inference only DeepLSTM in plain numpy, with the same `initial_state` and `forward_one`.
+    loads the weights saved from DeepLSTM, e.g. `main_*.npz`.
+    """
+    xp = np
+
+    def __init__(self, config: NetworkConfig, params: Mapping[str, np.ndarray]) -> None:
+        self.n_layers = config.n_layers
+        self.hidden_size = config.hidden_size
+        self.char_embed_size = config.char_embed_size
+        self.conditioning = config.conditioning
+
+        self.embed_W = params['embed/W'] if config.char_embed_size is not None else None
+
+        # NStepLSTM weights are (input, forget, cell, output) gates of the input (0-3) and the hidden (4-7)
+        self.x_weights = []  # shape: List[(?, 4*hidden_size)]
+        self.h_weights = []  # shape: List[(hidden_size, 4*hidden_size)]
+        self.biases = []  # shape: List[(4*hidden_size, )]
+        for i in range(config.n_layers):
+            w = [params[f'lstm/{i}/w{j}'] for j in range(8)]
+            b = [params[f'lstm/{i}/b{j}'] for j in range(8)]
+            self.x_weights.append(np.ascontiguousarray(np.concatenate(w[:4], axis=0).T))
+            self.h_weights.append(np.ascontiguousarray(np.concatenate(w[4:], axis=0).T))
+            self.biases.append(np.concatenate(b[:4]) + np.concatenate(b[4:]))
+
+        self.post_W = np.ascontiguousarray(params['post_linear/W'].T)
+        self.post_b = params['post_linear/b']
+
+        if config.conditioning != 'concat':
+            self.vec_W = np.ascontiguousarray(params['vec_linear/W'].T)
+            self.vec_b = params['vec_linear/b']
+
+        self._buffers: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def load(cls, config: NetworkConfig, model_path: Path):
+        return cls(config, dict(np.load(str(model_path))))
+
+    def _get_buffers(self, batch_size: int):
+        """
+        work buffers for the gates, reused over the steps
+        """
+        if batch_size not in self._buffers:
+            self._buffers[batch_size] = (
+                np.empty((batch_size, 4 * self.hidden_size), dtype=np.float32),
+                np.empty((batch_size, 4 * self.hidden_size), dtype=np.float32),
+            )
+        return self._buffers[batch_size]
+
+    def initial_state(self, vecs: np.ndarray):
+        """
+        :param vecs: shape: (batch, num_vec)
+        """
+        if self.conditioning == 'concat':
+            return None, None, vecs
+
+        v = vecs.dot(self.vec_W) + self.vec_b
+        if self.conditioning == 'add':
+            return None, None, v
+
+        state = v.reshape(len(vecs), 2, self.n_layers, self.hidden_size).transpose(1, 2, 0, 3)
+        return np.ascontiguousarray(state[0]), np.ascontiguousarray(state[1]), None
+
+    def forward_one(
+            self,
+            hs: Optional[np.ndarray],
+            cs: Optional[np.ndarray],
+            x: np.ndarray,
+            v: Optional[np.ndarray],
+    ):
+        """
+        :param hs: shape: (n_layers, batch, hidden_size), updated in place
+        :param cs: shape: (n_layers, batch, hidden_size), updated in place
+        :param x: shape: (batch, num_char) one-hot arrays or (batch, ) char ids
+        :param v: shape: (batch, ?), the term given by `initial_state`
+        :return:
+            hs:
+            cs:
+            x: shape: (batch, num_id)
+        """
+        batch_size = len(x)
+        if hs is None:
+            hs = np.zeros((self.n_layers, batch_size, self.hidden_size), dtype=np.float32)
+            cs = np.zeros((self.n_layers, batch_size, self.hidden_size), dtype=np.float32)
+
+        if self.embed_W is not None:
+            x = self.embed_W[np.maximum(x, 0)] * (x >= 0)[:, np.newaxis]  # the start id (-1) is a zero vector
+
+        if self.conditioning == 'concat':
+            x = np.concatenate([x, v], axis=1)
+        elif self.conditioning == 'add':
+            x = x + v
+
+        gates, work = self._get_buffers(batch_size)
+        size = self.hidden_size
+        for i in range(self.n_layers):
+            np.dot(x, self.x_weights[i], out=gates)
+            np.dot(hs[i], self.h_weights[i], out=work)
+            gates += work
+            gates += self.biases[i]
+
+            _sigmoid(gates[:, :2 * size])
+            _sigmoid(gates[:, 3 * size:])
+            np.tanh(gates[:, 2 * size:3 * size], out=gates[:, 2 * size:3 * size])
+
+            input_gate, forget_gate, cell, output_gate = np.split(gates, 4, axis=1)
+            cs[i] *= forget_gate
+            cs[i] += input_gate * cell
+            np.tanh(cs[i], out=hs[i])
+            hs[i] *= output_gate
+            x = hs[i]
+
+        x = x.dot(self.post_W) + self.post_b
+        return hs, cs, x
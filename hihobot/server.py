@@ -0,0 +1,218 @@
+import asyncio
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from hihobot.hihobot import Hihobot
+
+
+class ServerBusyError(Exception):
+    pass
+
+
+class ReplyServer(object):
+    """
+    replies to texts with dynamic micro-batching.
+    texts are vectorized in a thread pool as they arrive, and queued vectors are decoded together,
+    up to `max_batch_size` vectors or `max_wait` seconds after the first one.
+    janome and doc2vec inference are not known to be thread-safe, so the vectorizing pool has one thread by default.
+    >>> class LengthBot(object):
+    ...     def text_to_vec(self, text):
+    ...         return np.array([len(text)])
+    ...     def generate_batch(self, vecs):
+    ...         return [str(int(vec[0])) for vec in vecs]
+    >>> async def run():
+    ...     server = ReplyServer(LengthBot())
+    ...     await server.start()
+    ...     replies = await asyncio.gather(server.reply('ab'), server.reply('abc'))
+    ...     await server.stop()
+    ...     return replies
+    >>> asyncio.run(run())
+    ['2', '3']
+
+    an error of a batch goes to its requests, and the server keeps replying
+    >>> class ShapeBot(LengthBot):
+    ...     def text_to_vec(self, text):
+    ...         return np.zeros(len(text))
+    >>> async def run_error():
+    ...     server = ReplyServer(ShapeBot())
+    ...     await server.start()
+    ...     replies = await asyncio.gather(server.reply('ab'), server.reply('abc'), return_exceptions=True)
+    ...     replies.append(await server.reply('a'))
+    ...     await server.stop()
+    ...     return [type(reply).__name__ if isinstance(reply, Exception) else reply for reply in replies]
+    >>> asyncio.run(run_error())
+    ['ValueError', 'ValueError', '0']
+    """
+
+    def __init__(
+            self,
+            hihobot: Hihobot,
+            max_batch_size: int = 32,
+            max_wait: float = 0.01,
+            max_pending: int = 256,
+            timeout: float = 10.0,
+            num_vectorize_thread: int = 1,
+    ) -> None:
+        self.hihobot = hihobot
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._vectorize_executor = ThreadPoolExecutor(num_vectorize_thread)
+        self._decode_executor = ThreadPoolExecutor(1)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Future] = None
+        self._num_pending = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._batch_task = asyncio.ensure_future(self._batch_loop())
+
+    async def stop(self):
+        self._batch_task.cancel()
+        try:
+            await self._batch_task
+        except asyncio.CancelledError:
+            pass
+        self._vectorize_executor.shutdown()
+        self._decode_executor.shutdown()
+
+    async def reply(self, text: str) -> str:
+        """
+        :raise ServerBusyError: when `max_pending` requests are already waiting
+        :raise asyncio.TimeoutError: when the reply takes more than `timeout` seconds
+        """
+        if self._num_pending >= self.max_pending:
+            raise ServerBusyError()
+
+        self._num_pending += 1
+        try:
+            return await asyncio.wait_for(self._reply(text), self.timeout)
+        finally:
+            self._num_pending -= 1
+
+    async def _reply(self, text: str):
+        loop = asyncio.get_event_loop()
+        vec = await loop.run_in_executor(self._vectorize_executor, self.hihobot.text_to_vec, text)
+
+        future = loop.create_future()
+        self._queue.put_nowait((vec, future))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_event_loop()
+
+        items: List[Tuple[np.ndarray, asyncio.Future]] = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # requests that timed out meanwhile are dropped
+        return [(vec, future) for vec, future in items if not future.done()]
+
+    async def _batch_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            items = await self._next_batch()
+            if len(items) == 0:
+                continue
+
+            try:
+                vecs = np.stack([vec for vec, _ in items])
+                texts = await loop.run_in_executor(self._decode_executor, self.hihobot.generate_batch, vecs)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), text in zip(items, texts):
+                if not future.done():
+                    future.set_result(text)
+
+    async def _handle_request(self, request: dict, writer: asyncio.StreamWriter):
+        response = dict(id=request.get('id'))
+        try:
+            response['text'] = await self.reply(request['text'])
+        except ServerBusyError:
+            response['error'] = 'busy'
+        except asyncio.TimeoutError:
+            response['error'] = 'timeout'
+        except Exception:
+            traceback.print_exc()
+            response['error'] = 'internal error'
+
+        writer.write(json.dumps(response, ensure_ascii=False).encode('utf8') + b'\n')
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        one JSON object per line, e.g. {"id": 0, "text": "..."}.
+        requests on one connection run concurrently, responses carry the same id.
+        every line gets one response.
+        >>> class LengthBot(object):
+        ...     def text_to_vec(self, text):
+        ...         return np.array([len(text)])
+        ...     def generate_batch(self, vecs):
+        ...         return [str(int(vec[0])) for vec in vecs]
+        >>> class StubWriter(object):
+        ...     def __init__(self):
+        ...         self.lines = []
+        ...     def write(self, data):
+        ...         self.lines.append(data.decode('utf8').strip())
+        ...     async def drain(self):
+        ...         pass
+        ...     def close(self):
+        ...         pass
+        >>> async def run(data: bytes):
+        ...     server = ReplyServer(LengthBot())
+        ...     await server.start()
+        ...     reader = asyncio.StreamReader()
+        ...     reader.feed_data(data)
+        ...     reader.feed_eof()
+        ...     writer = StubWriter()
+        ...     await server.handle_connection(reader, writer)
+        ...     await server.stop()
+        ...     return sorted(writer.lines)
+        >>> for line in asyncio.run(run(b'{"id": 0, "text": "ab"}\\n{"id": 1}\\n[1]\\n{\\n')):
+        ...     print(line)
+        {"error": "invalid json"}
+        {"error": "invalid request"}
+        {"id": 0, "text": "2"}
+        {"id": 1, "error": "invalid request"}
+        """
+        tasks = []
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                break
+
+            try:
+                request = json.loads(line.decode('utf8'))
+            except ValueError:
+                writer.write(b'{"error": "invalid json"}\n')
+                continue
+
+            if not isinstance(request, dict) or not isinstance(request.get('text'), str):
+                response = dict(id=request['id']) if isinstance(request, dict) and 'id' in request else {}
+                response['error'] = 'invalid request'
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf8') + b'\n')
+                continue
+
+            tasks.append(asyncio.ensure_future(self._handle_request(request, writer)))
+
+        if len(tasks) > 0:
+            await asyncio.wait(tasks)
+        writer.close()
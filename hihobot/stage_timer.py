@@ -0,0 +1,102 @@
+import time
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, Optional, Sequence, Tuple
+
+stages = (
+    'iterator',  # waiting for the next batch, the iterator starves the updater if this is large
+    'get_example',
+    'tokenize',
+    'infer_vector',
+    'convert',
+    'forward',
+    'backward',
+    'reduce',  # gathering the gradients of the workers in CpuParallelUpdater
+    'update',
+    'evaluate',  # forward without backprop, e.g. in Evaluator
+)
+
+
+class StageTimer(object):
+    """
+    sums wall time and counts per stage in shared memory,
+    so the forked workers of the iterators add to the same counters.
+    """
+
+    def __init__(self, names: Sequence[str] = stages) -> None:
+        self.names = list(names)
+        self._indices = {name: i for i, name in enumerate(self.names)}
+        self._seconds = RawArray('d', len(self.names))
+        self._counts = RawArray('q', len(self.names))
+        self._lock = Lock()
+
+    def add(self, name: str, seconds: float, count: int = 1):
+        i = self._indices[name]
+        with self._lock:
+            self._seconds[i] += seconds
+            self._counts[i] += count
+
+    def measure(self, name: str, count: int = 1):
+        return _Measure(self, name, count)
+
+    def pop(self) -> Dict[str, Tuple[float, int]]:
+        """
+        :return: seconds and count of each stage since the last pop
+        """
+        with self._lock:
+            result = {name: (self._seconds[i], self._counts[i]) for i, name in enumerate(self.names)}
+            for i in range(len(self.names)):
+                self._seconds[i] = 0
+                self._counts[i] = 0
+        return result
+
+
+class _Measure(object):
+    def __init__(self, timer: StageTimer, name: str, count: int) -> None:
+        self.timer = timer
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timer.add(self.name, time.perf_counter() - self.start, self.count)
+
+
+class _NoMeasure(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_no_measure = _NoMeasure()
+_timer: Optional[StageTimer] = None
+
+
+def set_stage_timer(timer: Optional[StageTimer]):
+    """
+    set before the iterators start their workers, forked workers inherit it
+    """
+    global _timer
+    _timer = timer
+
+
+def get_stage_timer():
+    return _timer
+
+
+def add_stage_time(name: str, seconds: float, count: int = 1):
+    if _timer is not None:
+        _timer.add(name, seconds, count)
+
+
+def measure(name: str, count: int = 1):
+    """
+    a context to time a stage, does nothing unless a timer is set
+    """
+    if _timer is None:
+        return _no_measure
+    return _timer.measure(name, count)
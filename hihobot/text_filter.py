@@ -0,0 +1,61 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class WordMatcher(object):
+    """
+    tells if a text contains any of the words, in one pass over the text.
+    uses pyahocorasick if installed, or one regex of all the words.
+    >>> matcher = WordMatcher(["foo", "bar"])
+    >>> matcher.contains_any("xxbarxx"), matcher.contains_any("fo ba")
+    (True, False)
+    """
+
+    def __init__(self, words: Iterable[str], use_ahocorasick: bool = True) -> None:
+        words = set(words)
+        self._contains_empty = '' in words
+        words.discard('')
+
+        self._automaton = None
+        self._regex = None
+        if len(words) == 0:
+            return
+
+        if use_ahocorasick and ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for word in words:
+                self._automaton.add_word(word, word)
+            self._automaton.make_automaton()
+        else:
+            self._regex = re.compile('|'.join(map(re.escape, sorted(words, key=len, reverse=True))))
+
+    def contains_any(self, s: str):
+        if self._contains_empty:
+            return True
+        if self._automaton is not None:
+            return next(self._automaton.iter(s), None) is not None
+        if self._regex is not None:
+            return self._regex.search(s) is not None
+        return False
+
+
+@lru_cache(maxsize=8)
+def _get_deletion_table(chars: str) -> Dict[int, None]:
+    return str.maketrans('', '', chars)
+
+
+def contain_unknown_chars(s: str, chars: str):
+    """
+    deletes the known chars by a translation table built once per `chars`
+    >>> contain_unknown_chars("hogehoge", chars="hoge")
+    False
+    >>> contain_unknown_chars("hogehoge", chars="hog")
+    True
+    """
+    return len(s.translate(_get_deletion_table(chars))) > 0
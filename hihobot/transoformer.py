@@ -13,6 +13,7 @@ class Transformer(object):
         self._num_char = len(chars)
         self._num_id = len(chars) + 1
         self._start_array = np.zeros(self._num_char, dtype=np.float32)
+        self._start_id = -1
 
     def get_end_id(self):
         return self._end_id
@@ -20,9 +21,15 @@ class Transformer(object):
     def get_num_id(self):
         return self._num_id
 
+    def get_start_id(self):
+        return self._start_id
+
     def get_start_array(self):  # shape: (num_char, )
         return self._start_array
 
+    def get_start_arrays(self, batch_size: int):  # shape: (batch, num_char)
+        return np.zeros((batch_size, self._num_char), dtype=np.float32)
+
     def to_char_id(self, char: str) -> int:
         return self._char_to_index[char]
 
@@ -34,6 +41,16 @@ class Transformer(object):
         array[char_id] = 1
         return array
 
+    def to_arrays(self, char_ids: np.ndarray):
+        """
+        :param char_ids: shape (batch, )
+        :return: shape (batch, num_char), the end id becomes a start (zero) array
+        """
+        array = np.zeros((len(char_ids), self._num_char), dtype=np.float32)
+        index = np.flatnonzero(char_ids != self._end_id)
+        array[index, char_ids[index]] = 1
+        return array
+
     def unshift_start_array(self, array: np.ndarray):
         """
         :param array: shape (length, num_id)
@@ -42,5 +59,8 @@ class Transformer(object):
         st = self._start_array[np.newaxis]  # shape (1, num_id)
         return np.concatenate([st, array], axis=0)  # shape (length+1, num_id)
 
+    def unshift_start_id(self, char_ids: List[int]):
+        return [self._start_id] + char_ids
+
     def push_end_id(self, char_ids: List[int]):
         return char_ids + [self._end_id]
@@ -1,5 +1,10 @@
 import json
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import AsyncResult, Pool
 from pathlib import Path
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional
 
 
 class JSONEncoder(json.JSONEncoder):
@@ -11,5 +16,55 @@ class JSONEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
+def _load_char(p: Path) -> List[str]:
+    return json.load(p.open(encoding="utf8"))
+
+
 def save_arguments(arguments, path: Path):
     json.dump(vars(arguments), path.open('w'), indent=2, sort_keys=True, cls=JSONEncoder)
+
+
+def _map_chunk(func: Callable[[Any], Any], chunk: List[Any]):
+    return [func(item) for item in chunk]
+
+
+def bounded_imap(
+        pool: Pool,
+        func: Callable[[Any], Any],
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        max_pending: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    `pool.imap` reading at most `max_pending` items ahead of the results.
+    `pool.imap` itself reads the whole iterable as fast as it can, holding all of it in memory.
+    the chunks are submitted from the consumer, so no thread of the pool waits for it,
+    and leaving the pool after an error does not hang.
+    :param max_pending: at least `chunksize`, defaults to four chunks per cpu
+    >>> with Pool(2) as pool:
+    ...     list(bounded_imap(pool, int, ['1', '2', '3'], chunksize=2))
+    [1, 2, 3]
+    >>> with Pool(2) as pool:
+    ...     list(bounded_imap(pool, int, ['1', 'x'] + ['3'] * 100, max_pending=4))
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid literal for int() with base 10: 'x'
+    """
+    if max_pending is None:
+        max_pending = chunksize * (os.cpu_count() or 1) * 4
+    if max_pending < chunksize:
+        raise ValueError('max_pending must be at least chunksize')
+    max_pending_chunk = max_pending // chunksize
+
+    pending: Deque[AsyncResult] = deque()
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if len(chunk) > 0:
+            pending.append(pool.apply_async(_map_chunk, (func, chunk)))
+
+        while len(pending) > 0 and (len(chunk) == 0 or len(pending) >= max_pending_chunk or pending[0].ready()):
+            yield from pending.popleft().get()
+
+        if len(chunk) == 0:
+            return
@@ -0,0 +1,101 @@
+import sqlite3
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+def normalize_text(text: str):
+    return unicodedata.normalize('NFC', text).strip()
+
+
+class VectorCache(object):
+    """
+    two-tier cache of text vectors: a bounded in-memory LRU backed by an optional sqlite store.
+    the sqlite store can be shared between processes, entries are separated by `namespace`.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            path: Optional[Path] = None,
+            namespace: str = '',
+    ) -> None:
+        self.max_size = max_size
+        self.namespace = namespace
+
+        self._memory: Dict[str, np.ndarray] = OrderedDict()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), timeout=60, isolation_level=None, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS vectors '
+                '(namespace TEXT, text TEXT, vec BLOB, PRIMARY KEY (namespace, text))'
+            )
+
+        self.num_hit = 0
+        self.num_disk_hit = 0
+        self.num_miss = 0
+        self.num_eviction = 0
+
+    def get(self, text: str, compute: Callable[[str], np.ndarray]):
+        """
+        :param compute: called with the normalized text on a miss
+        """
+        key = normalize_text(text)
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.num_hit += 1
+            return self._memory[key]
+
+        vec = self._load(key)
+        if vec is not None:
+            self.num_disk_hit += 1
+        else:
+            self.num_miss += 1
+            vec = np.asarray(compute(key), dtype=np.float32)
+            self._store(key, vec)
+
+        vec.flags.writeable = False
+        self._put_memory(key, vec)
+        return vec
+
+    def _put_memory(self, key: str, vec: np.ndarray):
+        if self.max_size <= 0:
+            return
+
+        self._memory[key] = vec
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.num_eviction += 1
+
+    def _load(self, key: str):
+        if self._db is None:
+            return None
+
+        row = self._db.execute(
+            'SELECT vec FROM vectors WHERE namespace = ? AND text = ?', (self.namespace, key),
+        ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32).copy() if row is not None else None
+
+    def _store(self, key: str, vec: np.ndarray):
+        if self._db is None:
+            return
+
+        self._db.execute(
+            'INSERT OR IGNORE INTO vectors VALUES (?, ?, ?)', (self.namespace, key, vec.tobytes()),
+        )
+
+    def get_stats(self):
+        return dict(
+            hit=self.num_hit,
+            disk_hit=self.num_disk_hit,
+            miss=self.num_miss,
+            eviction=self.num_eviction,
+            size=len(self._memory),
+        )
@@ -1,20 +1,164 @@
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Union
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from gensim.models import Doc2Vec
-from janome.tokenizer import Tokenizer
+import numpy as np
+
+
+class BaseTokenizer(object):
+    def to_words(self, text: str) -> List[str]:
+        raise NotImplementedError()
+
+    def to_words_many(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        for text in texts:
+            yield self.to_words(text)
+
+
+class JanomeTokenizer(BaseTokenizer):
+    def __init__(self) -> None:
+        from janome.tokenizer import Tokenizer
+        self._model = Tokenizer()
+
+    def to_words(self, text: str):
+        return [t.surface for t in self._model.tokenize(text)]
+
+
+class JanomeWakatiTokenizer(BaseTokenizer):
+    """
+    same words as JanomeTokenizer, without building Token objects
+    """
+
+    def __init__(self) -> None:
+        from janome.tokenizer import Tokenizer
+        self._model = Tokenizer(wakati=True)
+
+    def to_words(self, text: str):
+        return list(self._model.tokenize(text, wakati=True))
+
+
+class MecabTokenizer(BaseTokenizer):
+    """
+    needs mecab-python3 and a dictionary, the words can differ from janome's
+    """
+
+    def __init__(self) -> None:
+        import MeCab
+        self._model = MeCab.Tagger('-Owakati')
+
+    def to_words(self, text: str):
+        return self._model.parse(text).split()
+
+
+tokenizer_classes = {
+    'janome': JanomeTokenizer,
+    'janome_wakati': JanomeWakatiTokenizer,
+    'mecab': MecabTokenizer,
+}
+
+
+def create_tokenizer(name: str) -> BaseTokenizer:
+    if name not in tokenizer_classes:
+        raise ValueError(name)
+    return tokenizer_classes[name]()
+
+
+def load_doc2vec_model(path: Union[str, Path], mmap: bool = False):
+    from gensim.models import Doc2Vec
+    return Doc2Vec.load(str(path), mmap='r' if mmap else None)
 
 
 class Vectorizer(object):
     def __init__(
             self,
-            path_doc2vec_model: Union[str, Path]
+            path_doc2vec_model: Optional[Union[str, Path]],
+            inference_seed: Optional[int] = None,
+            mmap: bool = False,
+            tokenizer: str = 'janome_wakati',
+            doc2vec_model: Any = None,
     ) -> None:
-        self._doc2vec_model = Doc2Vec.load(str(path_doc2vec_model))
-        self._janome_model = Tokenizer()
+        """
+        the tokenizer is built on the first use, janome takes a while to load its dictionary.
+        :param doc2vec_model: an already loaded model, e.g. from a bundle, instead of `path_doc2vec_model`
+        """
+        self._path_doc2vec_model = path_doc2vec_model
+        if doc2vec_model is None:
+            doc2vec_model = load_doc2vec_model(path_doc2vec_model, mmap=mmap)
+        self._doc2vec_model = doc2vec_model
+        self._tokenizer_name = tokenizer
+        self._tokenizer: Optional[BaseTokenizer] = None
+        self._inference_seed = inference_seed
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = create_tokenizer(self._tokenizer_name)
+        return self._tokenizer
+
+    def get_vector_size(self) -> int:
+        return self._doc2vec_model.vector_size
 
     def to_vec(self, words: List[str]):
+        if self._inference_seed is not None:
+            # infer_vector draws its negative samples from the model's random state
+            self._doc2vec_model.random = np.random.RandomState(self._inference_seed)
         return self._doc2vec_model.infer_vector(words)
 
     def to_words(self, text: str):
-        return [t.surface for t in self._janome_model.tokenize(text)]
+        return self.tokenizer.to_words(text)
+
+    def to_words_many(self, texts: Iterable[str]):
+        return self.tokenizer.to_words_many(texts)
+
+    def text_to_vec(self, text: str):
+        return self.to_vec(self.to_words(text))
+
+    def iterate_words_and_vecs(
+            self,
+            texts: Iterable[str],
+            n_workers: int = None,
+            chunksize: int = 100,
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        vectorize many texts over a process pool, yielding the words and the vector of each text in order.
+        every text is tokenized once, for both.
+        every worker loads the doc2vec model once with mmap, so the large arrays are shared.
+        a vectorizer made from a loaded model has no path to give the workers and runs inline.
+        :param n_workers: number of processes, None means the number of cpus
+        """
+        if n_workers == 1 or self._path_doc2vec_model is None:
+            for words in self.to_words_many(texts):
+                yield words, self.to_vec(words)
+            return
+
+        initargs = (self._path_doc2vec_model, self._inference_seed, self._tokenizer_name)
+        with Pool(n_workers, initializer=_init_worker, initargs=initargs) as pool:
+            yield from pool.imap(_worker_text_to_words_and_vec, texts, chunksize=chunksize)
+
+    def iterate_vecs(self, texts: Iterable[str], n_workers: int = None, chunksize: int = 100) -> Iterator[np.ndarray]:
+        """
+        the vectors of `iterate_words_and_vecs`
+        """
+        for _, vec in self.iterate_words_and_vecs(texts, n_workers=n_workers, chunksize=chunksize):
+            yield vec
+
+    def to_vecs(self, texts: Sequence[str], n_workers: int = None, chunksize: int = 100):
+        """
+        :return: shape: (len(texts), vector_size)
+        """
+        vecs = np.empty((len(texts), self.get_vector_size()), dtype=np.float32)
+        for i, vec in enumerate(self.iterate_vecs(texts, n_workers=n_workers, chunksize=chunksize)):
+            vecs[i] = vec
+        return vecs
+
+
+_worker_vectorizer: Optional[Vectorizer] = None
+
+
+def _init_worker(path_doc2vec_model: Union[str, Path], inference_seed: Optional[int], tokenizer: str):
+    global _worker_vectorizer
+    _worker_vectorizer = Vectorizer(path_doc2vec_model, inference_seed=inference_seed, mmap=True, tokenizer=tokenizer)
+
+
+def _worker_text_to_words_and_vec(text: str):
+    words = _worker_vectorizer.to_words(text)
+    return words, _worker_vectorizer.to_vec(words)
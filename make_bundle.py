@@ -0,0 +1,48 @@
+import argparse
+from pathlib import Path
+
+from hihobot.bundle import save_bundle
+from hihobot.config import create_from_json as create_config
+from hihobot.dataset import _load_char
+from hihobot.numpy_network import NumpyDeepLSTM
+from hihobot.vectorizer import load_doc2vec_model
+
+
+def make_bundle(
+        model_path: Path,
+        model_config: Path,
+        char_path: Path,
+        doc2vec_model_path: Path,
+        output_path: Path,
+):
+    config = create_config(model_config)
+    if char_path is None:
+        char_path = Path(config.dataset.char_path)
+    if doc2vec_model_path is None:
+        doc2vec_model_path = Path(config.dataset.doc2vec_model_path)
+
+    save_bundle(
+        output_path,
+        config=config,
+        chars=_load_char(char_path),
+        predictor=NumpyDeepLSTM.load(config.network, model_path),
+        doc2vec_model=load_doc2vec_model(doc2vec_model_path),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', '-mp', type=Path)
+    parser.add_argument('--model_config', '-mc', type=Path)
+    parser.add_argument('--char_path', '-cp', type=Path)
+    parser.add_argument('--doc2vec_model_path', '-dmp', type=Path)
+    parser.add_argument('--output_path', '-o', type=Path)
+    args = parser.parse_args()
+
+    make_bundle(
+        model_path=args.model_path,
+        model_config=args.model_config,
+        char_path=args.char_path,
+        doc2vec_model_path=args.doc2vec_model_path,
+        output_path=args.output_path,
+    )
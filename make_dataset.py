@@ -1,20 +1,53 @@
 import argparse
 import json
+import os
 from collections import Counter
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 
-import ndjson
+from hihobot.text_filter import WordMatcher, contain_unknown_chars
+from hihobot.utility import bounded_imap
 
+_worker_matcher: Optional[WordMatcher] = None
+_worker_chars: Optional[str] = None
 
-def contain_unknown_chars(s: str, chars: str):
+
+def _init_worker(eliminate_words: List[str], chars: Optional[str]):
+    global _worker_matcher, _worker_chars
+    _worker_matcher = WordMatcher(eliminate_words)
+    _worker_chars = chars
+
+
+def _iterate_chunks(texts_path: Path, chunk_size: int) -> Iterator[List[str]]:
     """
-    >>> contain_unknown_chars("hogehoge", chars="hoge")
-    False
-    >>> contain_unknown_chars("hogehoge", chars="hog")
-    True
+    the texts split by whitespaces, in chunks of lines.
+    a text never spans lines since a new line is a whitespace, so this equals `.read().split()`.
     """
-    return len(set(s) - set(chars)) > 0
+    with texts_path.open(encoding='UTF8') as f:
+        chunk: List[str] = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+
+def _split_texts(lines: List[str]):
+    return [s for line in lines for s in line.split() if not _worker_matcher.contains_any(s)]
+
+
+def _count_chars(lines: List[str]):
+    counter = Counter()
+    for s in _split_texts(lines):
+        counter.update(s)
+    return counter
+
+
+def _filter_texts(lines: List[str]):
+    return [s for s in _split_texts(lines) if not contain_unknown_chars(s, chars=_worker_chars)]
 
 
 def make_dataset(
@@ -23,16 +56,30 @@ def make_dataset(
         eliminate_words: List[str],
         out_text: Path,
         out_char: Path,
+        chunk_size: int,
+        num_process: int,
 ):
-    texts: List[str] = texts_path.open(encoding='UTF8').read().split()
-    texts = list(filter(lambda s: all(w not in s for w in eliminate_words), texts))
-
-    counter = Counter("".join(texts))
+    """
+    two streaming passes over the texts in chunks of lines, on a process pool:
+    counting the chars, and writing the texts made only of the most common chars.
+    the counters of the chunks are merged in order, so the ties of most_common are broken as with one counter.
+    """
+    counter = Counter()
+    with Pool(num_process, initializer=_init_worker, initargs=(eliminate_words, None)) as pool:
+        for chunk_counter in bounded_imap(pool, _count_chars, _iterate_chunks(texts_path, chunk_size)):
+            counter.update(chunk_counter)
     chars = "".join(c[0] for c in counter.most_common(num_chars))
 
-    texts = list(filter(lambda s: not contain_unknown_chars(s, chars=chars), texts))
+    with Pool(num_process, initializer=_init_worker, initargs=(eliminate_words, chars)) as pool, \
+            out_text.open('w', encoding='UTF8') as f:
+        first = True
+        for texts in bounded_imap(pool, _filter_texts, _iterate_chunks(texts_path, chunk_size)):
+            for s in texts:
+                if not first:
+                    f.write('\n')
+                f.write(json.dumps({"str": s}, ensure_ascii=False))
+                first = False
 
-    ndjson.dump([{"str": s} for s in texts], out_text.open('w', encoding='UTF8'), ensure_ascii=False)
     json.dump([c for c in chars], out_char.open('w', encoding='UTF8'), ensure_ascii=False)
 
     # show alphabet
@@ -50,6 +97,8 @@ if __name__ == '__main__':
     parser.add_argument('--eliminate_words', type=str, nargs='*', default=[])
     parser.add_argument('--output_dataset_text', type=Path, default=Path('dataset_text.ndjson'))
     parser.add_argument('--output_dataset_char', type=Path, default=Path('dataset_char.json'))
+    parser.add_argument('--chunk_size', type=int, default=10000, help='number of lines per task')
+    parser.add_argument('--num_process', type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     make_dataset(
@@ -58,4 +107,6 @@ if __name__ == '__main__':
         eliminate_words=args.eliminate_words,
         out_text=args.output_dataset_text,
         out_char=args.output_dataset_char,
+        chunk_size=args.chunk_size,
+        num_process=args.num_process,
     )
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from hihobot.hihobot import Hihobot
+from hihobot.server import ReplyServer
+
+
+def serve(
+        model_dir: Path,
+        model_iteration: int,
+        model_config: Path,
+        char_path: Path,
+        doc2vec_model_path: Path,
+        max_length: int,
+        sampling_maximum: bool,
+        gpu: int,
+        engine: str,
+        bundle_path: Path,
+        host: str,
+        port: int,
+        unix_socket: Path,
+        max_batch_size: int,
+        max_wait: float,
+        max_pending: int,
+        timeout: float,
+):
+    if bundle_path is not None:
+        hihobot = Hihobot.from_bundle(
+            bundle_path,
+            max_length=max_length,
+            sampling_maximum=sampling_maximum,
+        )
+    else:
+        from generate import _get_predictor_model_path  # imports chainer
+
+        model_path = _get_predictor_model_path(
+            model_dir=model_dir,
+            iteration=model_iteration,
+        )
+        hihobot = Hihobot(
+            model_path=model_path,
+            model_config=model_config,
+            char_path=char_path,
+            doc2vec_model_path=doc2vec_model_path,
+            max_length=max_length,
+            sampling_maximum=sampling_maximum,
+            gpu=gpu,
+            engine=engine,
+        )
+    server = ReplyServer(
+        hihobot,
+        max_batch_size=max_batch_size,
+        max_wait=max_wait,
+        max_pending=max_pending,
+        timeout=timeout,
+    )
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start())
+    if unix_socket is not None:
+        listener = loop.run_until_complete(asyncio.start_unix_server(server.handle_connection, str(unix_socket)))
+    else:
+        listener = loop.run_until_complete(asyncio.start_server(server.handle_connection, host, port))
+    print('serving on', [s.getsockname() for s in listener.sockets])
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        loop.run_until_complete(server.stop())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_dir', '-md', type=Path)
+    parser.add_argument('--model_iteration', '-mi', type=int)
+    parser.add_argument('--model_config', '-mc', type=Path)
+    parser.add_argument('--char_path', '-cp', type=Path)
+    parser.add_argument('--doc2vec_model_path', '-dmp', type=Path)
+    parser.add_argument('--max_length', '-ml', type=int, default=32)
+    parser.add_argument('--sampling_maximum', '-sm', action='store_true')
+    parser.add_argument('--gpu', type=int)
+    parser.add_argument('--engine', choices=['chainer', 'numpy'], default='chainer')
+    parser.add_argument('--bundle_path', '-bp', type=Path)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix_socket', type=Path)
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_wait', type=float, default=0.01)
+    parser.add_argument('--max_pending', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    arguments = parser.parse_args()
+
+    serve(
+        model_dir=arguments.model_dir,
+        model_iteration=arguments.model_iteration,
+        model_config=arguments.model_config,
+        char_path=arguments.char_path,
+        doc2vec_model_path=arguments.doc2vec_model_path,
+        max_length=arguments.max_length,
+        sampling_maximum=arguments.sampling_maximum,
+        gpu=arguments.gpu,
+        engine=arguments.engine,
+        bundle_path=arguments.bundle_path,
+        host=arguments.host,
+        port=arguments.port,
+        unix_socket=arguments.unix_socket,
+        max_batch_size=arguments.max_batch_size,
+        max_wait=arguments.max_wait,
+        max_pending=arguments.max_pending,
+        timeout=arguments.timeout,
+    )
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import chainer
+import numpy as np
+
+from generate import _extract_number
+from hihobot.config import Config, create_from_json as create_config
+from hihobot.dataset import create_test
+from hihobot.model import Model, create_predictor
+from utility.data_convert_utility import data_convert
+
+_worker_config: Optional[Config] = None
+_worker_batches: Optional[List[Dict[str, List[np.ndarray]]]] = None
+
+
+def _init_worker(config: Config, batches: List[Dict[str, List[np.ndarray]]]):
+    global _worker_config, _worker_batches
+    _worker_config = config
+    _worker_batches = batches
+
+
+def _score(model_path: Path):
+    """
+    :return: the teacher-forced test loss averaged over all chars
+    """
+    predictor = create_predictor(_worker_config.network, train=False)
+    chainer.serializers.load_npz(str(model_path), predictor)
+    model = Model(loss_config=_worker_config.loss, predictor=predictor)
+
+    sum_loss = 0.0
+    num_char = 0
+    with chainer.using_config('train', False), chainer.using_config('enable_backprop', False):
+        for batch in _worker_batches:
+            n = sum(len(t) for t in batch['target_ids'])
+            sum_loss += float(model(**batch).array) * n
+            num_char += n
+    return model_path, sum_loss / num_char
+
+
+def sweep_checkpoints(
+        model_dir: Path,
+        model_config: Path,
+        cache_dir: Path,
+        batchsize: int,
+        num_process: int,
+        prefix: str,
+):
+    """
+    results are appended to `sweep.ndjson` as they finish, and checkpoints recorded there are skipped.
+    only the test split is vectorized, or read from the dataset cache if it is fresh,
+    and its vectors are saved to `sweep_test.npz`, so every run scores on the same vectors.
+    """
+    config = create_config(model_config)
+    dataset_config = config.dataset
+    if cache_dir is not None:
+        dataset_config = dataset_config._replace(cache_dir=str(cache_dir))
+
+    record_path = model_dir / 'sweep.ndjson'
+    records = {}
+    if record_path.exists():
+        for line in record_path.read_text().splitlines():
+            record = json.loads(line)
+            records[record['checkpoint']] = record
+
+    model_paths = sorted(model_dir.glob(prefix + '*.npz'), key=_extract_number)
+    model_paths = [p for p in model_paths if p.name not in records]
+    print(f'{len(model_paths)} checkpoints to score, {len(records)} recorded')
+
+    if len(model_paths) > 0:
+        char_id_input = config.network.char_embed_size is not None
+        examples = create_test(dataset_config, cache_path=model_dir / 'sweep_test.npz', char_id_input=char_id_input)
+        batches = [data_convert(examples[i:i + batchsize]) for i in range(0, len(examples), batchsize)]
+
+        initargs = (config, batches)
+        with Pool(num_process, initializer=_init_worker, initargs=initargs) as pool, record_path.open('a') as f:
+            for model_path, loss in pool.imap_unordered(_score, model_paths):
+                record = dict(checkpoint=model_path.name, iteration=_extract_number(model_path), loss=loss)
+                records[record['checkpoint']] = record
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                print(f'{model_path.name}: {loss:.4f}')
+
+    ranking = sorted(records.values(), key=lambda r: r['loss'])
+    lines = ['rank\titeration\tcheckpoint\tloss']
+    lines += [f'{i}\t{r["iteration"]}\t{r["checkpoint"]}\t{r["loss"]:.6f}' for i, r in enumerate(ranking, start=1)]
+    (model_dir / 'sweep.tsv').write_text('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_dir', '-md', type=Path)
+    parser.add_argument('--model_config', '-mc', type=Path)
+    parser.add_argument('--cache_dir', type=Path, help='a dataset cache used only if it is fresh')
+    parser.add_argument('--batchsize', '-bs', type=int, default=64)
+    parser.add_argument('--num_process', '-np', type=int, default=os.cpu_count())
+    parser.add_argument('--prefix', default='main_')
+    arguments = parser.parse_args()
+
+    sweep_checkpoints(
+        model_dir=arguments.model_dir,
+        model_config=arguments.model_config,
+        cache_dir=arguments.cache_dir,
+        batchsize=arguments.batchsize,
+        num_process=arguments.num_process,
+        prefix=arguments.prefix,
+    )
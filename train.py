@@ -1,19 +1,23 @@
 import argparse
+import os
 from copy import copy
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict
 
 from chainer import cuda, optimizer_hooks, optimizers, training
-from chainer.iterators import MultiprocessIterator
+from chainer.iterators import MultiprocessIterator, SerialIterator
 from chainer.training import extensions
-from chainer.training.updaters import StandardUpdater
 from tb_chainer import SummaryWriter
 
 from hihobot.config import create_from_json
 from hihobot.dataset import create as create_dataset
 from hihobot.model import Model, create_predictor
-from utility.chainer_extension_utility import TensorBoardReport
-from utility.data_convert_utility import data_convert
+from hihobot.stage_timer import StageTimer, set_stage_timer
+from utility.chainer_extension_utility import StageTimeReport, TensorBoardReport
+from utility.data_convert_utility import PackedConverter, precompute_batches, precomputed_convert
+from utility.iterator_utility import BucketIterator
+from utility.updater_utility import CpuParallelUpdater, TimedStandardUpdater
 
 parser = argparse.ArgumentParser()
 parser.add_argument('config_json_path', type=Path)
@@ -35,11 +39,32 @@ if config.train.gpu is not None:
     model.to_gpu(config.train.gpu)
     cuda.get_device_from_id(config.train.gpu).use()
 
+# the iterators' workers inherit the timer
+stage_timer = StageTimer()
+set_stage_timer(stage_timer)
+
 # dataset
-dataset = create_dataset(config.dataset)
-train_iter = MultiprocessIterator(dataset['train'], config.train.batchsize, repeat=True, shuffle=True)
-test_iter = MultiprocessIterator(dataset['test'], config.train.batchsize, repeat=False, shuffle=False)
-train_eval_iter = MultiprocessIterator(dataset['train_eval'], config.train.batchsize, repeat=False, shuffle=False)
+dataset = create_dataset(config.dataset, char_id_input=config.network.char_embed_size is not None)
+if config.train.max_tokens is not None:
+    _Iterator = partial(BucketIterator, max_tokens=config.train.max_tokens, n_processes=os.cpu_count())
+else:
+    _Iterator = partial(MultiprocessIterator, batch_size=config.train.batchsize)
+train_iter = _Iterator(dataset['train'], repeat=True, shuffle=True)
+converter = PackedConverter()
+
+
+# the evaluation batches are made once and kept on the device, so every evaluation sees the same vectors
+def create_eval_iterator(eval_dataset):
+    batches = precompute_batches(
+        _Iterator(eval_dataset, repeat=False, shuffle=False),
+        converter=converter,
+        device=config.train.gpu,
+    )
+    return SerialIterator(batches, 1, repeat=False, shuffle=False)
+
+
+test_iter = create_eval_iterator(dataset['test'])
+train_eval_iter = create_eval_iterator(dataset['train_eval'])
 
 
 # optimizer
@@ -65,12 +90,22 @@ def create_optimizer(model):
 optimizer = create_optimizer(model)
 
 # updater
-updater = StandardUpdater(
-    iterator=train_iter,
-    optimizer=optimizer,
-    converter=data_convert,
-    device=config.train.gpu,
-)
+if config.train.num_cpu_workers is not None:
+    if config.train.gpu is not None:
+        raise ValueError('num_cpu_workers is for cpu training')
+    updater = CpuParallelUpdater(
+        iterator=train_iter,
+        optimizer=optimizer,
+        converter=converter,
+        n_processes=config.train.num_cpu_workers,
+    )
+else:
+    updater = TimedStandardUpdater(
+        iterator=train_iter,
+        optimizer=optimizer,
+        converter=converter,
+        device=config.train.gpu,
+    )
 
 # trainer
 trigger_log = (config.train.log_iteration, 'iteration')
@@ -83,19 +118,25 @@ tb_writer = SummaryWriter(Path(arguments.output))
 if config.train.linear_shift is not None:
     trainer.extend(extensions.LinearShift(**config.train.linear_shift))
 
-ext = extensions.Evaluator(test_iter, model, data_convert, device=config.train.gpu)
+ext = extensions.Evaluator(test_iter, model, precomputed_convert, device=config.train.gpu)
 trainer.extend(ext, name='test', trigger=trigger_log)
-ext = extensions.Evaluator(train_eval_iter, model, data_convert, device=config.train.gpu)
+ext = extensions.Evaluator(train_eval_iter, model, precomputed_convert, device=config.train.gpu)
 trainer.extend(ext, name='train', trigger=trigger_log)
 
 ext = extensions.snapshot_object(predictor, filename='main_{.updater.iteration}.npz')
 trainer.extend(ext, trigger=trigger_snapshot)
 
+trainer.extend(StageTimeReport(stage_timer))
 trainer.extend(extensions.FailOnNonNumber(), trigger=trigger_log)
 trainer.extend(extensions.observe_lr(), trigger=trigger_log)
 trainer.extend(extensions.LogReport(trigger=trigger_log))
 trainer.extend(extensions.PrintReport(['main/loss', 'test/main/loss']), trigger=trigger_log)
-trainer.extend(TensorBoardReport(writer=tb_writer), trigger=trigger_log)
+ext = TensorBoardReport(
+    writer=tb_writer,
+    histogram_trigger=(config.train.histogram_iteration, 'iteration'),
+    max_histogram_size=config.train.histogram_max_size,
+)
+trainer.extend(ext, trigger=trigger_log)
 if trigger_stop is not None:
     trainer.extend(extensions.ProgressBar(trigger_stop))
 
@@ -1,27 +1,123 @@
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 
 import chainer
 from tb_chainer import SummaryWriter
 
+from hihobot.stage_timer import StageTimer
+
 
 class TensorBoardReport(chainer.training.Extension):
-    def __init__(self, writer=None):
+    """
+    writes the observations, and the histograms of the parameters, to TensorBoard from a background thread.
+    the training loop only copies the values to cpu and queues them, a full queue blocks it.
+    the time the training loop spends here is reported as `tensorboard/stall_time`.
+    :param histogram_trigger: trigger of the histograms, checked on each call, every call if None
+    :param max_histogram_size: a parameter larger than this is subsampled with a stride for its histogram
+    """
+    priority = chainer.training.PRIORITY_EDITOR  # after the writers, and before LogReport reads the stall time
+
+    def __init__(
+            self,
+            writer=None,
+            histogram_trigger=None,
+            max_histogram_size: Optional[int] = None,
+            max_queue_size: int = 8,
+    ):
         self.writer = writer
+        self.histogram_trigger = None if histogram_trigger is None else chainer.training.trigger.get_trigger(
+            histogram_trigger)
+        self.max_histogram_size = max_histogram_size
+
+        self._queue: queue.Queue = queue.Queue(max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            n_iter, scalars, histograms = item
+            for n, v in scalars.items():
+                self.writer.add_scalar(n, v, n_iter)
+            for n, v in histograms.items():
+                self.writer.add_histogram(n, v, n_iter, bins=100)
+
+    def _subsample(self, data):
+        data = data.ravel()
+        if self.max_histogram_size is not None and data.size > self.max_histogram_size:
+            data = data[::-(-data.size // self.max_histogram_size)]
+        return chainer.cuda.to_cpu(data).copy()  # the optimizer updates the parameters in place
 
     def __call__(self, trainer: chainer.training.Trainer):
+        start = time.perf_counter()
+
         if self.writer is None:
             self.writer = SummaryWriter(Path(trainer.out))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, daemon=True)
+            self._thread.start()
 
-        observations = trainer.observation
         n_iter = trainer.updater.iteration
-        for n, v in observations.items():
+
+        scalars = {}
+        for n, v in trainer.observation.items():
             if isinstance(v, chainer.Variable):
                 v = v.data
-            if isinstance(v, chainer.cuda.cupy.ndarray):
-                v = chainer.cuda.to_cpu(v)
+            scalars[n] = chainer.cuda.to_cpu(v)
+
+        histograms = {}
+        if self.histogram_trigger is None or self.histogram_trigger(trainer):
+            link = trainer.updater.get_optimizer('main').target
+            for name, param in link.namedparams():
+                histograms[name] = self._subsample(param.data)
 
-            self.writer.add_scalar(n, v, n_iter)
+        self._queue.put((n_iter, scalars, histograms))
+
+        stall_time = time.perf_counter() - start
+        chainer.report({'tensorboard/stall_time': stall_time})
+        try:
+            self._queue.put_nowait((n_iter, {'tensorboard/stall_time': stall_time}, {}))
+        except queue.Full:
+            pass
+
+    def finalize(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+class StageTimeReport(chainer.training.Extension):
+    """
+    reports the time of each stage measured by StageTimer every iteration, for LogReport and TensorBoardReport.
+    stage/{name}: seconds spent in the stage, summed over the workers of the iterators
+    stage/starvation: the fraction of the wall time the updater waited for the iterator
+    the evaluators' conversions and examples are counted in the iteration they run.
+    """
+    trigger = 1, 'iteration'
+    priority = chainer.training.PRIORITY_WRITER
+
+    def __init__(self, timer: StageTimer):
+        self.timer = timer
+        self._last_time: Optional[float] = None
+
+    def initialize(self, trainer):
+        self.timer.pop()
+        self._last_time = time.perf_counter()
+
+    def __call__(self, trainer: chainer.training.Trainer):
+        now = time.perf_counter()
+        elapsed = now - self._last_time
+        self._last_time = now
 
-        link = trainer.updater.get_optimizer('main').target
-        for name, param in link.namedparams():
-            self.writer.add_histogram(name, chainer.cuda.to_cpu(param.data), n_iter, bins=100)
+        stages = self.timer.pop()
+        observation = {f'stage/{name}': seconds for name, (seconds, _) in stages.items()}
+        observation['stage/examples_per_sec'] = stages['iterator'][1] / elapsed
+        observation['stage/chars_per_sec'] = stages['forward'][1] / elapsed
+        observation['stage/starvation'] = stages['iterator'][0] / elapsed
+        chainer.report(observation)
@@ -1,8 +1,12 @@
-from typing import List
+from typing import Any, Callable, Dict, List, Sequence
 
+import chainer
+import numpy as np
+from chainer import cuda
 from chainer.dataset import to_device
 
 from hihobot.dataset import Data
+from hihobot.stage_timer import measure
 
 
 def data_convert(
@@ -12,8 +16,78 @@ def data_convert(
     if len(batch) == 0:
         raise ValueError('batch is empty')
 
-    return dict(
-        input_array=[to_device(device, d.input_array) for d in batch],
-        target_ids=[to_device(device, d.target_ids) for d in batch],
-        vec=[to_device(device, d.vec) for d in batch],
-    )
+    with measure('convert', count=len(batch)):
+        return dict(
+            input_array=[to_device(device, d.input_array) for d in batch],
+            target_ids=[to_device(device, d.target_ids) for d in batch],
+            vec=[to_device(device, d.vec) for d in batch],
+        )
+
+
+class PackedConverter(object):
+    """
+    packs each field of a batch into one array, transferred once, with the boundaries between the examples.
+    the model takes them by `sections`.
+    on gpu, the fields are staged in pinned host buffers reused over the batches.
+    """
+
+    def __init__(self) -> None:
+        self._pinned_memories: Dict[str, Any] = {}
+
+    def _get_staging(self, name: str, shape: Sequence[int], dtype: np.dtype):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        memory = self._pinned_memories.get(name)
+        if memory is None or memory.size() < nbytes:
+            memory = self._pinned_memories[name] = cuda.cupy.cuda.alloc_pinned_memory(max(nbytes, 1))
+        return np.ndarray(shape, dtype=dtype, buffer=memory)
+
+    def _pack(self, name: str, arrays: List[np.ndarray], device, stack: bool):
+        if stack:
+            shape = (len(arrays),) + arrays[0].shape
+        else:
+            shape = (sum(len(a) for a in arrays),) + arrays[0].shape[1:]
+        concatenate = np.stack if stack else np.concatenate
+
+        if device is None or device < 0:
+            return concatenate(arrays)
+
+        staging = self._get_staging(name, shape, arrays[0].dtype)
+        concatenate(arrays, out=staging)
+        with cuda.get_device_from_id(device):
+            array = cuda.cupy.empty(shape, dtype=staging.dtype)
+            array.set(staging)  # synchronous, so the staging buffer can be reused
+        return array
+
+    def __call__(self, batch: List[Data], device=None):
+        if len(batch) == 0:
+            raise ValueError('batch is empty')
+
+        with measure('convert', count=len(batch)):
+            return dict(
+                input_array=self._pack('input_array', [d.input_array for d in batch], device, stack=False),
+                target_ids=self._pack('target_ids', [d.target_ids for d in batch], device, stack=False),
+                vec=self._pack('vec', [d.vec for d in batch], device, stack=True),
+                sections=np.cumsum([len(d.target_ids) for d in batch])[:-1],
+            )
+
+
+def precompute_batches(
+        iterator: chainer.dataset.Iterator,
+        converter: Callable[[List[Data], Any], Any] = data_convert,
+        device=None,
+):
+    """
+    convert all batches of a non repeating iterator once, e.g. for an Evaluator to reuse them on every trigger.
+    use with `SerialIterator(batches, 1, repeat=False, shuffle=False)` and `precomputed_convert`.
+    """
+    batches = [converter(batch, device) for batch in iterator]
+    if hasattr(iterator, 'finalize'):
+        iterator.finalize()
+    return batches
+
+
+def precomputed_convert(batch: List[Any], device=None):
+    """
+    a converter for an iterator of batches from `precompute_batches`, already on the device
+    """
+    return batch[0]
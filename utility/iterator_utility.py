@@ -0,0 +1,167 @@
+import time
+from multiprocessing import Pool
+from typing import List, Optional
+
+import chainer
+import numpy as np
+
+_worker_dataset = None
+
+
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _worker_get_examples(indices: List[int]):
+    return [_worker_dataset[i] for i in indices]
+
+
+class BucketIterator(chainer.dataset.Iterator):
+    """
+    groups examples of similar length, and makes batches by a total length budget instead of a batch size.
+    the dataset needs `get_length(i)`.
+    a repeating iterator reports its padding efficiency and tokens/sec.
+    """
+
+    def __init__(
+            self,
+            dataset,
+            max_tokens: int,
+            repeat=True,
+            shuffle=True,
+            bucket_width=4,
+            n_processes: Optional[int] = None,
+    ):
+        self.dataset = dataset
+        self.max_tokens = max_tokens
+        self._repeat = repeat
+        self._shuffle = shuffle
+        self.bucket_width = bucket_width
+
+        self.lengths = np.array([dataset.get_length(i) for i in range(len(dataset))])
+
+        self._pool = None
+        if n_processes is not None:
+            self._pool = Pool(n_processes, initializer=_init_worker, initargs=(dataset,))
+        self._prefetched = None
+
+        self._last_time: Optional[float] = None
+        self.reset()
+
+    def _create_batches(self):
+        indices = np.arange(len(self.lengths))
+        if self._shuffle:
+            indices = np.random.permutation(indices)
+
+        # stable sort keeps the shuffled order inside each bucket
+        buckets = self.lengths[indices] // self.bucket_width
+        indices = indices[np.argsort(buckets, kind='stable')]
+
+        batches: List[np.ndarray] = []
+        start, num_token = 0, 0
+        for i, length in enumerate(self.lengths[indices]):
+            if i > start and num_token + length > self.max_tokens:
+                batches.append(indices[start:i])
+                start, num_token = i, 0
+            num_token += length
+        batches.append(indices[start:])
+
+        if self._shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        return batches
+
+    def _fetch(self, indices: np.ndarray):
+        if self._pool is None:
+            return None
+        return self._pool.apply_async(_worker_get_examples, (indices.tolist(),))
+
+    def __next__(self):
+        if not self._repeat and self.epoch > 0:
+            raise StopIteration
+
+        self._previous_epoch_detail = self.epoch_detail
+
+        indices = self._batches[self.current_position]
+        if self._prefetched is not None:
+            batch = self._prefetched.get()
+        elif self._pool is not None:
+            batch = self._fetch(indices).get()
+        else:
+            batch = [self.dataset[i] for i in indices]
+
+        self.current_position += 1
+        if self.current_position == len(self._batches):
+            self.current_position = 0
+            self.epoch += 1
+            self.is_new_epoch = True
+            if self._repeat:
+                self._batches = self._create_batches()
+        else:
+            self.is_new_epoch = False
+
+        if self._repeat or self.epoch == 0:
+            self._prefetched = self._fetch(self._batches[self.current_position])
+        else:
+            self._prefetched = None
+
+        if self._repeat:
+            self._report(indices)
+        return batch
+
+    next = __next__
+
+    def _report(self, indices: np.ndarray):
+        lengths = self.lengths[indices]
+        num_token = lengths.sum()
+
+        values = dict(padding_efficiency=num_token / (lengths.max() * len(lengths)))
+
+        now = time.time()
+        if self._last_time is not None:
+            values['tokens_per_sec'] = num_token / (now - self._last_time)
+        self._last_time = now
+
+        chainer.report({'iterator/' + k: v for k, v in values.items()})
+
+    @property
+    def epoch_detail(self):
+        return self.epoch + self.current_position / len(self._batches)
+
+    @property
+    def previous_epoch_detail(self):
+        if self._previous_epoch_detail < 0:
+            return None
+        return self._previous_epoch_detail
+
+    @property
+    def repeat(self):
+        return self._repeat
+
+    def reset(self):
+        self.current_position = 0
+        self.epoch = 0
+        self.is_new_epoch = False
+        self._previous_epoch_detail = -1.
+        self._batches = self._create_batches()
+        self._prefetched = self._fetch(self._batches[0])
+
+    def serialize(self, serializer):
+        self.current_position = serializer('current_position', self.current_position)
+        self.epoch = serializer('epoch', self.epoch)
+        self.is_new_epoch = serializer('is_new_epoch', self.is_new_epoch)
+        self._previous_epoch_detail = serializer('previous_epoch_detail', self._previous_epoch_detail)
+
+        if isinstance(serializer, chainer.serializer.Serializer):
+            serializer('order', np.concatenate(self._batches))
+            serializer('batch_sizes', np.array([len(b) for b in self._batches]))
+        else:
+            order = serializer('order', None)
+            batch_sizes = serializer('batch_sizes', None)
+            self._batches = np.split(order, np.cumsum(batch_sizes)[:-1])
+            self._prefetched = self._fetch(self._batches[self.current_position])
+
+    def finalize(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
@@ -0,0 +1,187 @@
+import multiprocessing
+import time
+from multiprocessing.sharedctypes import RawArray
+from typing import List
+
+import chainer
+import numpy as np
+from chainer.dataset import convert
+from chainer.training.updaters import StandardUpdater
+
+from hihobot.dataset import Data
+from hihobot.stage_timer import add_stage_time, measure
+
+
+class TimedStandardUpdater(StandardUpdater):
+    """
+    StandardUpdater timing the wait for the iterator, the backward and the optimizer update separately.
+    the forward and the converter are timed by their own hooks.
+    """
+
+    def update_core(self):
+        iterator = self._iterators['main']
+        start = time.perf_counter()
+        batch = iterator.next()
+        add_stage_time('iterator', time.perf_counter() - start, count=len(batch))
+
+        in_arrays = convert._call_converter(self.converter, batch, self.input_device)
+
+        optimizer = self._optimizers['main']
+        loss_func = self.loss_func or optimizer.target
+
+        if isinstance(in_arrays, tuple):
+            loss = loss_func(*in_arrays)
+        elif isinstance(in_arrays, dict):
+            loss = loss_func(**in_arrays)
+        else:
+            loss = loss_func(in_arrays)
+
+        with measure('backward'):
+            optimizer.target.cleargrads()
+            loss.backward(loss_scale=optimizer._loss_scale)
+            del loss
+
+        with measure('update'):
+            optimizer.update()
+
+        if self.auto_new_epoch and iterator.is_new_epoch:
+            optimizer.new_epoch(auto=True)
+
+
+def _worker_loop(model, converter, connection, params_buffer, grads_buffer, offsets: List[int], seed: int):
+    """
+    runs in a forked process on a replica of the model.
+    the parameters are views of the buffer the parent writes, and the gradients are written to this worker's buffer.
+    :param seed: of numpy, the fork copies the random state of the parent and the dropout masks would be the same
+    """
+    np.random.seed(seed)
+
+    params = [param for _, param in sorted(model.namedparams())]
+    for param, start, end in zip(params, offsets[:-1], offsets[1:]):
+        param.array = np.frombuffer(params_buffer, dtype=np.float32)[start:end].reshape(param.shape)
+    grads = np.frombuffer(grads_buffer, dtype=np.float32)
+
+    # a fresh reporter, the parent's one is copied by the fork
+    reporter = chainer.Reporter()
+    reporter.add_observer('main', model)
+
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            break
+
+        with reporter.scope({}):
+            model.cleargrads()
+            loss = model(**converter(batch, None))
+            loss.backward()
+
+        for param, start, end in zip(params, offsets[:-1], offsets[1:]):
+            grads[start:end] = param.grad.ravel() if param.grad is not None else 0
+        connection.send(float(loss.array))
+
+
+class CpuParallelUpdater(StandardUpdater):
+    """
+    data parallel training over cpu processes.
+    every batch is split into `n_processes` shards of about the same number of chars,
+    the parent and `n_processes - 1` forked workers compute the gradients of a shard each on their replica,
+    and the gradients are averaged by the number of chars through shared memory before the optimizer update.
+    the converter must return a dict for the model.
+    """
+
+    def __init__(self, iterator, optimizer, converter, n_processes: int, **kwargs):
+        super().__init__(iterator=iterator, optimizer=optimizer, converter=converter, **kwargs)
+        self.n_processes = n_processes
+
+        model = optimizer.target
+        self._params = [param for _, param in sorted(model.namedparams())]
+        if any(param.dtype != np.float32 for param in self._params):
+            raise ValueError('only float32 parameters are supported')
+
+        self._offsets = [0] + np.cumsum([param.size for param in self._params]).tolist()
+        size = self._offsets[-1]
+
+        self._params_buffer = RawArray('f', size)
+        self._write_params()
+
+        context = multiprocessing.get_context('fork')
+        self._connections = []
+        self._grads = []
+        self._processes = []
+        seeds = np.random.randint(2 ** 31, size=n_processes - 1)  # reproducible with the seed of the parent
+        for seed in seeds:
+            grads_buffer = RawArray('f', size)
+            connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_worker_loop,
+                args=(model, converter, child_connection, self._params_buffer, grads_buffer, self._offsets, int(seed)),
+                daemon=True,
+            )
+            process.start()
+            self._connections.append(connection)
+            self._grads.append(np.frombuffer(grads_buffer, dtype=np.float32))
+            self._processes.append(process)
+
+    def _write_params(self):
+        params = np.frombuffer(self._params_buffer, dtype=np.float32)
+        for param, start, end in zip(self._params, self._offsets[:-1], self._offsets[1:]):
+            params[start:end] = param.array.ravel()
+
+    def _split(self, batch: List[Data]):
+        """
+        :return: up to `n_processes` non empty shards with about the same number of chars
+        """
+        lengths = np.cumsum([len(d.target_ids) for d in batch])
+        n = min(self.n_processes, len(batch))
+        ends = np.searchsorted(lengths, lengths[-1] * np.arange(1, n) / n, side='right')
+        ends = np.unique(np.clip(np.concatenate([ends, [len(batch)]]), 1, len(batch)))
+        starts = np.concatenate([[0], ends[:-1]])
+        return [batch[start:end] for start, end in zip(starts, ends)]
+
+    def update_core(self):
+        iterator = self._iterators['main']
+        start = time.perf_counter()
+        batch = iterator.next()
+        add_stage_time('iterator', time.perf_counter() - start, count=len(batch))
+
+        shards = self._split(batch)
+        for connection, shard in zip(self._connections, shards[1:]):
+            connection.send(shard)
+
+        optimizer = self._optimizers['main']
+        loss_func = self.loss_func or optimizer.target
+
+        loss = loss_func(**self.converter(shards[0], self.input_device))
+        with measure('backward'):
+            optimizer.target.cleargrads()
+            loss.backward(loss_scale=optimizer._loss_scale)
+
+        num_chars = np.array([sum(len(d.target_ids) for d in shard) for shard in shards])
+        weights = num_chars / num_chars.sum()
+        with measure('reduce'):
+            losses = [float(loss.array)] + [connection.recv() for connection in self._connections[:len(shards) - 1]]
+            for param, start, end in zip(self._params, self._offsets[:-1], self._offsets[1:]):
+                if param.grad is None:
+                    param.grad = np.zeros_like(param.array)
+                param.grad *= weights[0]
+                for weight, grads in zip(weights[1:], self._grads):
+                    param.grad += weight * grads[start:end].reshape(param.shape)
+        del loss
+
+        with measure('update'):
+            optimizer.update()
+            self._write_params()
+
+        chainer.report({'loss': float(np.dot(weights, losses))}, optimizer.target)
+
+        if self.auto_new_epoch and iterator.is_new_epoch:
+            optimizer.new_epoch(auto=True)
+
+    def finalize(self):
+        for connection in self._connections:
+            connection.send(None)
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+        super().finalize()